@@ -11,9 +11,13 @@ Uses in-memory storage (no database) for single-session analysis workflow.
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from io import BytesIO
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import asyncio
+import heapq
 import logging
+from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 import os
 import sys
@@ -21,14 +25,16 @@ import sys
 # Add parent directories to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Only the schemas referenced by route decorators are imported here; FastAPI
+# needs them when the routes are registered, so they cannot be deferred.
 try:
     from backend.schemas import (
-        UserCreate, UserResponse, ForecastResponse, MBARuleResponse,
+        UserCreate, UserResponse, MBARuleResponse,
         RecommendationResponse, DashboardSummary, UploadResponse,
     )
 except ImportError:
     from schemas import (
-        UserCreate, UserResponse, ForecastResponse, MBARuleResponse,
+        UserCreate, UserResponse, MBARuleResponse,
         RecommendationResponse, DashboardSummary, UploadResponse,
     )
 
@@ -43,16 +49,44 @@ data_store: Dict[str, Any] = {
     "mba_rules": [],            # list of MBA rule dicts
     "recommendations": [],      # list of recommendation dicts
     "model_metrics": [],        # list of metric dicts
+    "forecasts_df": None,       # pd.DataFrame views of the lists above,
+    "mba_rules_df": None,       # built once per upload for the summary
+    "model_metrics_df": None,   # queries
+    "indexes": {},              # per-list inverted indexes, see _index_records
+    "forecasts_cols": None,     # columnar forecasts for /forecast, see _forecast_columns
+    "summary_tables": None,     # per-pulau aggregates for the summary, see _build_summary_tables
     "user": None,               # user session info dict
+    "version": 0,               # bumped whenever the stored data changes
     "metadata": {
         "last_updated": None,
         "upload_timestamp": None,
+        "total_records_trained": 0,  # historical forecast rows, counted at upload
     }
 }
 
-# Initialize FastAPI app
+# Uploads rebuild the whole store; the pipeline stages run in worker threads
+# (so health checks stay responsive), and this lock keeps uploads from
+# interleaving their writes.
+_upload_lock = asyncio.Lock()
+
+# Logging: the app's own loggers (this module plus the pipeline services,
+# which upload_data imports as backend.services.* or, standalone, services.*)
+# write to stdout at LOG_LEVEL (default INFO); set LOG_LEVEL=WARNING in
+# production to skip the per-upload progress messages. The root logger and
+# third-party loggers are left to the server running the app.
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+for _name in (__name__, "backend.services", "services"):
+    _app_logger = logging.getLogger(_name)
+    _app_logger.setLevel(LOG_LEVEL)
+    if not _app_logger.handlers:
+        _app_logger.addHandler(_log_handler)
+    _app_logger.propagate = False
 logger = logging.getLogger(__name__)
 
+# Initialize FastAPI app
+
 app = FastAPI(
     title="DataNiaga API",
     description="Retail Decision Support System - AI-powered forecasting and recommendations",
@@ -60,24 +94,26 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
 )
 
 # CORS configuration for React frontend
-# Vercel domains, localhost for dev, and wildcard for flexibility
-allowed_origins = [
-    "http://localhost:5173",
-    "http://localhost:3000",
-    "http://127.0.0.1:5173",
-    "http://127.0.0.1:3000",
-    "https://*.vercel.app",
-    "*",
-]
+# Vercel deployments (any *.vercel.app host) and localhost for dev, matched by
+# one precompiled regex. A comma-separated ALLOWED_ORIGINS env var replaces it
+# with an explicit list. There is no "*" entry: browsers reject a wildcard
+# origin on credentialed requests.
+ALLOWED_ORIGIN_REGEX = r"https://([a-z0-9-]+\.)*vercel\.app|http://(localhost|127\.0\.0\.1):(3000|5173|8080)"
+allowed_origins_env = os.getenv("ALLOWED_ORIGINS", "").strip()
+allowed_origins = [o.strip() for o in allowed_origins_env.split(",") if o.strip()]
 
 logger.info("FastAPI app initialized")
 
+# Starlette builds the middleware stack lazily on the first request it serves,
+# so registering CORS at import time adds nothing to health-check cold starts.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
+    allow_origin_regex=None if allowed_origins else ALLOWED_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -86,6 +122,10 @@ app.add_middleware(
 
 # Required columns for data validation
 REQUIRED_COLUMNS = ['InvoiceNo', 'InvoiceDate', 'PULAU', 'PRODUCT_CATEGORY', 'Quantity']
+REQUIRED_COLUMNS_SET = frozenset(REQUIRED_COLUMNS)
+
+# Opt-in faster CSV parser (pandas' pyarrow engine) for uploads
+FAST_IO = os.getenv("DATANIAGA_FAST_IO", "").strip() == "1"
 
 
 def validate_dataframe(df) -> None:
@@ -98,12 +138,531 @@ def validate_dataframe(df) -> None:
     Raises:
         HTTPException: If required columns are missing
     """
+    if REQUIRED_COLUMNS_SET.issubset(df.columns):
+        return
+    # Only build the (ordered) message on the failure path
     missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Missing required columns: {', '.join(missing)}"
+    raise HTTPException(
+        status_code=400, 
+        detail=f"Missing required columns: {', '.join(missing)}"
+    )
+
+
+def _read_upload(reader, source, fast_engine: Optional[str] = None):
+    """
+    Parse an uploaded file with a pandas reader.
+
+    Only the REQUIRED_COLUMNS are parsed (the pipelines use nothing else).
+    If the file lacks one of them, the reader raises an error naming the
+    missing columns, which upload_data reports as a 400.
+
+    When FAST_IO is enabled `fast_engine` is tried first; if that engine is
+    not installed, the source is rewound and parsed with the reader's
+    default engine.
+
+    Args:
+        reader: pandas reader function (pd.read_csv / pd.read_excel)
+        source: Seekable file-like object with the upload contents
+        fast_engine: Engine name to try when FAST_IO is enabled, or None
+            to always use the default engine
+    """
+    if FAST_IO and fast_engine:
+        try:
+            return reader(source, engine=fast_engine, usecols=REQUIRED_COLUMNS)
+        except ImportError as e:
+            logger.info("Fast reader '%s' unavailable, using default engine: %s", fast_engine, e)
+            source.seek(0)
+    return reader(source, usecols=REQUIRED_COLUMNS)
+
+
+@lru_cache(maxsize=512)
+def _norm(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize a query-parameter filter to the `_pulau_key`/`_prod_key` form.
+
+    Returns None for a missing or empty value (no filter). Cached because
+    the UI sends the same handful of island/product names over and over.
+    """
+    return value.strip().lower() if value else None
+
+
+@lru_cache(maxsize=512)
+def _strip(value: Optional[str]) -> Optional[str]:
+    """
+    Strip a query-parameter filter for the endpoints that match pulau exactly.
+
+    /mba-rules and /recommendations compare the stripped island name
+    case-sensitively. Returns None for a missing or empty value (no filter).
+    """
+    return value.strip() if value else None
+
+
+@lru_cache(maxsize=1024, typed=True)
+def _record_key(value: Any) -> str:
+    """
+    Normalize a stored record's pulau/product_category to its filter key.
+
+    Uploads repeat the same few islands and categories across thousands of
+    records, so the str/strip/lower work is done once per distinct value.
+    """
+    return str(value).strip().lower()
+
+
+def _index_records(name: str) -> None:
+    """
+    Normalize filter keys on `data_store[name]` and rebuild its inverted index.
+
+    Each record gets `_pulau_key` (and `_prod_key` when it has a
+    product_category) holding the stripped, lowercased value. The index maps
+    each key to the ascending positions of the records carrying it, so
+    filtered GETs touch only the matching rows (see `_select_records`).
+    """
+    by_pulau = defaultdict(list)
+    by_product = defaultdict(list)
+    for i, r in enumerate(data_store[name]):
+        r['_pulau_key'] = _record_key(r.get('pulau', ''))
+        by_pulau[r['_pulau_key']].append(i)
+        if 'product_category' in r:
+            r['_prod_key'] = _record_key(r.get('product_category', ''))
+            by_product[r['_prod_key']].append(i)
+    data_store["indexes"][name] = {"pulau": dict(by_pulau), "product": dict(by_product)}
+
+
+def _select_records(
+    name: str,
+    pulau_norm: Optional[str] = None,
+    product_norm: Optional[str] = None,
+    widen: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Return records of `data_store[name]` matching the normalized filters.
+
+    `pulau_norm` is an exact key match and `product_norm` a substring match
+    on the product key, the same semantics as a linear scan. Records come
+    back in stored order. With `widen`, a pulau+product filter that matches
+    nothing falls back to the product filter alone.
+    """
+    records = data_store[name]
+    if pulau_norm is None and product_norm is None:
+        return records
+
+    index = data_store["indexes"].get(name)
+    if index is None:
+        return []
+
+    if pulau_norm is not None:
+        rows = [records[i] for i in index["pulau"].get(pulau_norm, [])]
+        if product_norm is not None:
+            rows = [r for r in rows if product_norm in r['_prod_key']]
+        if rows or not widen or product_norm is None:
+            return rows
+
+    buckets = [pos for key, pos in index["product"].items() if product_norm in key]
+    return [records[i] for i in heapq.merge(*buckets)]
+
+
+def _index_recommendations() -> None:
+    """
+    Add `pulau_exact`, `type` and `priority` buckets to the `recommendations` index.
+
+    Each maps the stripped (case-preserved) field value to the ascending
+    positions of the recommendations carrying it, so /recommendations
+    filters by bucket lookups instead of re-stripping every record per
+    request.
+    """
+    index = data_store["indexes"]["recommendations"]
+    for name, field in (("pulau_exact", "pulau"), ("type", "type"), ("priority", "priority")):
+        buckets = defaultdict(list)
+        for i, r in enumerate(data_store["recommendations"]):
+            buckets[str(r.get(field, '')).strip()].append(i)
+        index[name] = dict(buckets)
+
+
+def _select_recommendations(
+    pulau: Optional[str],
+    rec_type: Optional[str],
+    priority: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Recommendations matching the exact (stripped) pulau, type and priority.
+
+    Empty values do not filter. Records come back in stored
+    order, like `_select_records`.
+    """
+    records = data_store["recommendations"]
+    index = data_store["indexes"].get("recommendations")
+    if index is None:
+        return records if pulau is None and not rec_type and not priority else []
+
+    positions = None
+    if pulau is not None:
+        positions = index["pulau_exact"].get(pulau, [])
+    for field, value in (("type", rec_type), ("priority", priority)):
+        if value:
+            bucket = index[field].get(value.strip(), [])
+            positions = bucket if positions is None else sorted(set(positions).intersection(bucket))
+    return records if positions is None else [records[i] for i in positions]
+
+
+def _index_rules_by_lift() -> None:
+    """
+    Add a lift-ordered index to the `mba_rules` inverted index.
+
+    `by_lift` maps each stripped island name (and None, for all rules) to
+    rule positions sorted by descending lift, ties kept in stored order. With it
+    /mba-rules reads rules best-first and stops at `min_lift` or `limit`
+    instead of filtering and sorting the whole list per request.
+    """
+    rules = data_store["mba_rules"]
+    index = data_store["indexes"]["mba_rules"]
+
+    def by_lift(positions):
+        return sorted(positions, key=lambda i: rules[i].get('lift', 0), reverse=True)
+
+    by_pulau = defaultdict(list)
+    for i, r in enumerate(rules):
+        by_pulau[str(r.get('pulau', '')).strip()].append(i)
+    ordered = {key: by_lift(positions) for key, positions in by_pulau.items()}
+    ordered[None] = by_lift(range(len(rules)))
+    index["by_lift"] = ordered
+
+
+def _select_rules(pulau: Optional[str], min_lift: float, limit: int) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` MBA rules with lift >= `min_lift`, highest lift first.
+
+    Walks the `_index_rules_by_lift` order, so it stops at the first rule
+    below the threshold (or once `limit` rules are collected).
+    """
+    rules = data_store["mba_rules"]
+    ordered = data_store["indexes"].get("mba_rules", {}).get("by_lift", {}).get(pulau, [])
+    selected = []
+    for i in ordered:
+        if len(selected) == limit or rules[i].get('lift', 0) < min_lift:
+            break
+        selected.append(rules[i])
+    # A negative limit never stops the walk; the slice then drops the last
+    # |limit| rules, as the original sorted(...)[:limit] did
+    return selected[:limit]
+
+
+@lru_cache(maxsize=64)
+def _island_names(version: int) -> tuple:
+    """
+    Sorted distinct island names in the stored forecasts.
+
+    Read from the one-row-per-series table of `_build_summary_tables`, so
+    the work is proportional to the number of series, not forecast rows.
+
+    `version` is `data_store["version"]`; it is part of the cache key so
+    that every upload invalidates earlier answers.
+    """
+    series = (data_store["summary_tables"] or {}).get("series")
+    if series is None:
+        return ()
+    return tuple(sorted(set(i for i in series['pulau'].dropna() if i)))
+
+
+@lru_cache(maxsize=64)
+def _product_names(version: int, pulau: Optional[str]) -> tuple:
+    """Sorted distinct product categories, optionally for one exact island name (cached like `_island_names`)."""
+    series = (data_store["summary_tables"] or {}).get("series")
+    if series is None:
+        return ()
+    if pulau is not None:
+        series = series[series['pulau'] == pulau]
+    return tuple(sorted(set(p for p in series['product_category'].dropna() if p)))
+
+
+def _records_frame(records: List[Dict[str, Any]]):
+    """Build a DataFrame from keyed records (see `_index_records`) for vectorized read queries."""
+    import pandas as pd
+
+    if not records:
+        return None
+    return pd.DataFrame(records)
+
+
+def _forecast_columns(frame) -> Optional[Dict[str, Any]]:
+    """
+    Lay the stored forecasts out as NumPy columns for the /forecast endpoint.
+
+    The normalized pulau/product keys are factorized into integer codes (with
+    a key -> code lookup for pulau and the distinct product levels for
+    substring tests), so filters compare small ints; `series_codes`
+    numbers each (product_category, pulau) series and `order` holds the row
+    positions sorted (stably) by week. Weeks are kept as ISO strings (formatted
+    once per distinct week) so responses go to orjson without a
+    jsonable_encoder pass. Response dicts are only built for the rows that
+    survive the filter (see `_forecast_rows`).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if frame is None:
+        return None
+    pulau_codes, pulau_levels = pd.factorize(frame['_pulau_key'])
+    product_codes, product_levels = pd.factorize(frame['_prod_key'])
+    week_codes, week_levels = pd.factorize(frame['week'], use_na_sentinel=False)
+    return {
+        "pulau_codes": pulau_codes,
+        "pulau_lookup": {key: code for code, key in enumerate(pulau_levels)},
+        "product_codes": product_codes,
+        "product_levels": np.asarray(product_levels, dtype=str),
+        "series_codes": frame.groupby(['product_category', 'pulau'], sort=False, dropna=False).ngroup().to_numpy(),
+        "order": np.argsort(frame['week'].to_numpy(), kind='stable'),
+        "week": np.array([w.isoformat() for w in week_levels], dtype=object)[week_codes],
+        "actual": frame['actual'].to_numpy(dtype=float),
+        "predicted": frame['predicted'].to_numpy(dtype=float),
+        "is_forecast": frame['is_forecast'].to_numpy().astype(bool),
+        "pulau": frame['pulau'].to_numpy(dtype=object),
+        "product_category": frame['product_category'].to_numpy(dtype=object),
+    }
+
+
+def _forecast_rows(
+    cols: Optional[Dict[str, Any]],
+    pulau_norm: Optional[str],
+    product_norm: Optional[str],
+    widen: bool = False,
+):
+    """
+    Week-ordered positions of the forecast rows matching the normalized filters.
+
+    Same semantics as `_select_records`: exact pulau key, substring product
+    key, ties in week kept in stored order, and the same `widen` fallback to
+    the product filter alone.
+    """
+    import numpy as np
+
+    if cols is None:
+        return np.empty(0, dtype=np.intp)
+    order = cols["order"]
+    mask = np.ones(len(order), dtype=bool)
+    if product_norm is not None:
+        # Substring test once per distinct product, then gather per row
+        level_match = np.char.find(cols["product_levels"], product_norm) >= 0
+        mask &= level_match[cols["product_codes"]]
+    if pulau_norm is not None:
+        pulau_mask = mask & (cols["pulau_codes"] == cols["pulau_lookup"].get(pulau_norm, -1))
+        if pulau_mask.any() or not widen or product_norm is None:
+            mask = pulau_mask
+    return order[mask[order]]
+
+
+def _format_forecast_rows(cols: Optional[Dict[str, Any]], rows) -> List[Dict[str, Any]]:
+    """Build the /forecast response dicts for the given row positions."""
+    if cols is None or not len(rows):
+        return []
+    actual = cols["actual"][rows]
+    return [
+        {
+            'week': week,
+            'actual': None if a != a else a,
+            'predicted': predicted,
+            'is_forecast': is_forecast,
+            'pulau': pul,
+            'product_category': prod,
+        }
+        for week, a, predicted, is_forecast, pul, prod in zip(
+            cols["week"][rows].tolist(),
+            actual.tolist(),
+            cols["predicted"][rows].tolist(),
+            cols["is_forecast"][rows].tolist(),
+            cols["pulau"][rows].tolist(),
+            cols["product_category"][rows].tolist(),
         )
+    ]
+
+
+# /forecast responses with more rows than this are streamed in chunks of this size
+FORECAST_STREAM_CHUNK = 2000
+
+
+def _forecast_json_chunks(cols: Dict[str, Any], rows, metrics: List[Dict[str, Any]]):
+    """
+    Yield the /forecast JSON body piece by piece.
+
+    The output is byte-for-byte what ORJSONResponse would render for
+    `{'forecast_data': [...], 'model_metrics': [...]}`, but the forecast
+    dicts are built and serialized FORECAST_STREAM_CHUNK rows at a time,
+    so large responses never hold the full list in memory.
+    """
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    yield b'{"forecast_data":['
+    for start in range(0, len(rows), FORECAST_STREAM_CHUNK):
+        chunk = orjson.dumps(_format_forecast_rows(cols, rows[start:start + FORECAST_STREAM_CHUNK]), option=options)
+        # Drop the chunk's own brackets and join chunks with commas
+        yield (b',' if start else b'') + chunk[1:-1]
+    yield b'],"model_metrics":' + orjson.dumps(metrics, option=options) + b'}'
+
+
+def _forecast_payload(pulau_norm: Optional[str], product_norm: Optional[str]):
+    """
+    Columns, matching row positions and formatted metrics for /forecast.
+
+    A pulau+product combination with no rows (or metrics) falls back to the
+    product alone.
+    """
+    cols = data_store["forecasts_cols"]
+    rows = _forecast_rows(cols, pulau_norm, product_norm, widen=True)
+    metrics = [
+        {
+            'pulau': m.get('pulau'),
+            'product_category': m.get('product_category'),
+            'mae': m.get('mae'),
+            'mape': m.get('mape'),
+            'sample_size': m.get('sample_size'),
+        }
+        for m in _select_records("model_metrics", pulau_norm, product_norm, widen=True)
+    ]
+    return cols, rows, metrics
+
+
+@lru_cache(maxsize=64)
+def _forecast_body(version: int, pulau_norm: Optional[str], product_norm: Optional[str]) -> Optional[bytes]:
+    """
+    Rendered /forecast JSON body, cached per data version like `_island_names`.
+
+    Returns None when the response is large enough to be streamed instead;
+    those are not cached so the cache stays small.
+    """
+    cols, rows, metrics = _forecast_payload(pulau_norm, product_norm)
+    if len(rows) > FORECAST_STREAM_CHUNK:
+        return None
+    return b"".join(_forecast_json_chunks(cols, rows, metrics))
+
+
+def _stockout_flags(cols: Dict[str, Any]):
+    """
+    Flag the forecast series whose last predicted week is below the one before it.
+
+    Works on the `_forecast_columns` arrays: the future rows are taken in
+    week order, stably regrouped by series, and the last two values of each
+    series compared in one vectorized step (missing predictions count as 0).
+    Returns one bool per `series_codes` value.
+    """
+    import numpy as np
+
+    codes = cols["series_codes"]
+    flags = np.zeros(int(codes.max()) + 1 if len(codes) else 0, dtype=bool)
+    order = cols["order"]
+    rows = order[cols["is_forecast"][order]]
+    if not len(rows):
+        return flags
+    series = codes[rows]
+    by_series = np.argsort(series, kind='stable')
+    series = series[by_series]
+    predicted = cols["predicted"][rows][by_series]
+    predicted = np.where(np.isnan(predicted), 0.0, predicted)
+
+    # Index of the last row of each series, kept only when the series has a previous row
+    last = np.flatnonzero(np.append(series[1:] != series[:-1], True))
+    last = last[(last > 0) & (series[last - 1] == series[last])]
+    flags[series[last]] = predicted[last] < predicted[last - 1]
+    return flags
+
+
+def _build_summary_tables() -> Dict[str, Any]:
+    """
+    Pre-aggregate the stored frames for /dashboard/summary.
+
+    Each table has one row per series or per `_pulau_key`, so the summary
+    reads a handful of rows per request however many forecasts, rules and
+    metrics the upload produced.
+    """
+    forecasts = data_store["forecasts_df"]
+    rules = data_store["mba_rules_df"]
+    metrics = data_store["model_metrics_df"]
+    tables: Dict[str, Any] = {"series": None, "errors": None, "opportunities": None, "metrics": None}
+
+    if forecasts is not None and not forecasts.empty:
+        keys = ['product_category', 'pulau']
+        # drop_duplicates keeps first appearances, the same order ngroup numbers series in
+        series = forecasts.drop_duplicates(keys)[keys + ['_pulau_key']].reset_index(drop=True)
+        series['stockout'] = _stockout_flags(data_store["forecasts_cols"])
+        tables["series"] = series
+
+        historical = forecasts[~forecasts['is_forecast'].astype(bool)]
+        actual = historical['actual']
+        predicted = historical['predicted']
+        valid = (actual > 0) & predicted.notna() & (predicted != 0)
+        errs = ((actual - predicted).abs() / actual)[valid]
+        tables["errors"] = errs.groupby(historical['_pulau_key'][valid]).agg(['sum', 'count'])
+
+    if rules is not None and not rules.empty:
+        tables["opportunities"] = rules[rules['lift'] >= 1.0].groupby('_pulau_key').size()
+
+    if metrics is not None and not metrics.empty:
+        tables["metrics"] = metrics.groupby('_pulau_key')['mape'].agg(['size', 'sum', 'count'])
+    return tables
+
+
+def _pulau_total(table, pulau_norm: Optional[str]):
+    """
+    Total a per-`_pulau_key` summary table, or return one island's row.
+
+    Returns None when the table is missing or has no row for the island.
+    """
+    if table is None:
+        return None
+    if pulau_norm is None:
+        return table.sum()
+    return table.loc[pulau_norm] if pulau_norm in table.index else None
+
+
+@lru_cache(maxsize=64)
+def _dashboard_summary(version: int, pulau: Optional[str]) -> Dict[str, Any]:
+    """
+    Dashboard summary values for an optional pulau filter, as a plain dict.
+
+    Reads only the `_build_summary_tables` aggregates and is cached on
+    `data_store["version"]` like `_island_names`.
+    """
+    tables = data_store["summary_tables"] or {}
+    pulau_norm = _norm(pulau) if pulau else None
+
+    series = tables.get("series")
+    if series is not None and pulau_norm is not None:
+        series = series[series['_pulau_key'] == pulau_norm]
+
+    if series is None or series.empty:
+        total_products = 0
+        total_islands = 0
+        stockout_risks = 0
+    else:
+        # Total Products → distinct product_category from forecasts
+        total_products = int(series['product_category'].nunique(dropna=False))
+
+        # Total Islands → global count when not filtered; if filtered, 1
+        total_islands = 1 if pulau else int(series['pulau'].nunique(dropna=False))
+
+        # Stockout Risk → demand decreasing: next forecast < current forecast per (product_category, pulau)
+        stockout_risks = int(series['stockout'].sum())
+
+    # Bundling Opportunities → from MBA rules produced by the model
+    opportunities = _pulau_total(tables.get("opportunities"), pulau_norm)
+    bundling_opportunities = 0 if opportunities is None else int(opportunities)
+
+    # Model Accuracy → from ModelMetric (direct MAPE value); fallback to calculated if metrics absent
+    metrics = _pulau_total(tables.get("metrics"), pulau_norm)
+    errors = _pulau_total(tables.get("errors"), pulau_norm)
+    if metrics is not None and metrics['size'] > 0:
+        accuracy = float(metrics['sum'] / metrics['count']) if metrics['count'] else 0.0
+    elif series is not None and not series.empty and errors is not None and errors['count']:
+        accuracy = float(errors['sum'] / errors['count'] * 100.0)
+    else:
+        accuracy = 0.0
+
+    return {
+        'total_products': total_products,
+        'total_islands': total_islands,
+        'stockout_risks': stockout_risks,
+        'opportunities': bundling_opportunities,
+        'forecast_accuracy': round(accuracy, 1)
+    }
 
 
 # ============================================
@@ -126,133 +685,174 @@ async def upload_data(file: UploadFile = File(...)):
     
     Data stored in-memory for session duration.
     """
-    try:
-        # Lazy imports of heavy libs (speed up cold start / health checks)
-        import pandas as pd
-
-        # Read uploaded file
-        content = await file.read()
-        
+    async with _upload_lock:
         try:
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(BytesIO(content))
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(BytesIO(content))
-            else:
+            # Lazy imports of heavy libs (speed up cold start / health checks)
+            import pandas as pd
+
+            # Read uploaded file straight from its spooled temp file (in memory,
+            # rolled to disk past 1 MB) instead of copying the body into a BytesIO
+            await file.seek(0)
+            
+            try:
+                if file.filename.endswith('.csv'):
+                    df = _read_upload(pd.read_csv, file.file, 'pyarrow')
+                elif file.filename.endswith(('.xlsx', '.xls')):
+                    df = _read_upload(pd.read_excel, file.file)
+                else:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail="File must be CSV (.csv) or Excel (.xlsx, .xls)"
+                    )
+            except HTTPException:
+                raise
+            except Exception as e:
                 raise HTTPException(
                     status_code=400, 
-                    detail="File must be CSV (.csv) or Excel (.xlsx, .xls)"
+                    detail=f"Error reading file: {str(e)}"
                 )
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Error reading file: {str(e)}"
+            
+            # Validate columns
+            validate_dataframe(df)
+            
+            # Clear existing in-memory data. The services only replace whole
+            # columns (run_all_forecasts parses InvoiceDate once for the later
+            # stages), so the upload frame is stored as-is rather than copied.
+            data_store["transactions"] = df
+            data_store["forecasts"] = []
+            data_store["mba_rules"] = []
+            data_store["recommendations"] = []
+            data_store["model_metrics"] = []
+            data_store["forecasts_df"] = None
+            data_store["mba_rules_df"] = None
+            data_store["model_metrics_df"] = None
+            data_store["indexes"] = {}
+            data_store["forecasts_cols"] = None
+            data_store["summary_tables"] = None
+            data_store["metadata"]["upload_timestamp"] = datetime.now().isoformat()
+            data_store["metadata"]["total_records_trained"] = 0
+            data_store["version"] += 1
+            
+            # Lazy import services only when needed
+            try:
+                try:
+                    from backend.services.forecasting import run_all_forecasts
+                    from backend.services.mba import run_all_mba
+                    from backend.services.recommendations import (
+                        generate_recommendations,
+                        get_stockout_risks,
+                        get_bundling_opportunities,
+                    )
+                except ImportError:
+                    from services.forecasting import run_all_forecasts
+                    from services.mba import run_all_mba
+                    from services.recommendations import (
+                        generate_recommendations,
+                        get_stockout_risks,
+                        get_bundling_opportunities,
+                    )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Service import failed: {str(e)}")
+
+            # Run forecasting and MBA pipelines concurrently; MBA only needs the
+            # raw frame. run_all_forecasts parses InvoiceDate in place, so that is
+            # done here first to keep it from reassigning the column while the MBA
+            # thread copies the frame.
+            logger.info("Starting forecasting and MBA pipelines...")
+            try:
+                if not pd.api.types.is_datetime64_any_dtype(df['InvoiceDate']):
+                    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+            except Exception as e:
+                logger.error("Error in forecasting pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
+
+            forecast_result, rules = await asyncio.gather(
+                asyncio.to_thread(run_all_forecasts, df),
+                asyncio.to_thread(run_all_mba, df),
+                return_exceptions=True,
             )
-        
-        # Validate columns
-        validate_dataframe(df)
-        
-        # Clear existing in-memory data
-        data_store["transactions"] = df.copy()
-        data_store["forecasts"] = []
-        data_store["mba_rules"] = []
-        data_store["recommendations"] = []
-        data_store["model_metrics"] = []
-        data_store["metadata"]["upload_timestamp"] = datetime.now().isoformat()
-        
-        # Lazy import services only when needed
-        try:
+
+            # Forecasting results (failures surface before MBA ones, as when run serially)
             try:
-                from backend.services.forecasting import run_all_forecasts
-                from backend.services.mba import run_all_mba
-                from backend.services.recommendations import (
-                    generate_recommendations,
-                    get_stockout_risks,
-                    get_bundling_opportunities,
-                )
-            except ImportError:
-                from services.forecasting import run_all_forecasts
-                from services.mba import run_all_mba
-                from services.recommendations import (
-                    generate_recommendations,
-                    get_stockout_risks,
-                    get_bundling_opportunities,
+                if isinstance(forecast_result, BaseException):
+                    raise forecast_result
+                forecast_records = forecast_result.get('forecast_data', []) if isinstance(forecast_result, dict) else (forecast_result or [])
+                model_metrics = forecast_result.get('model_metrics', []) if isinstance(forecast_result, dict) else []
+            except Exception as e:
+                logger.error("Error in forecasting pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
+
+            # Store forecasts in memory
+            try:
+                data_store["forecasts"] = list(forecast_records)
+                data_store["metadata"]["total_records_trained"] = sum(1 for f in forecast_records if not f.get('is_forecast'))
+                _index_records("forecasts")
+                logger.info("Stored %s forecast records in memory", len(forecast_records))
+            except Exception as e:
+                logger.error("Error storing forecasts: %s", e)
+                raise HTTPException(status_code=500, detail=f"Error storing forecast data: {str(e)}")
+
+            # Store model metrics in memory
+            try:
+                data_store["model_metrics"] = list(model_metrics)
+                _index_records("model_metrics")
+                logger.info("Stored %s metric entries in memory", len(model_metrics))
+            except Exception as e:
+                logger.error("Error storing metrics: %s", e)
+                raise HTTPException(status_code=500, detail=f"Error storing model metrics: {str(e)}")
+            
+            # Store MBA results
+            try:
+                if isinstance(rules, BaseException):
+                    raise rules
+                data_store["mba_rules"] = list(rules)
+                _index_records("mba_rules")
+                _index_rules_by_lift()
+                logger.info("Stored %s MBA rules in memory", len(rules))
+            except Exception as e:
+                logger.error("Error in MBA pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"MBA pipeline failed: {str(e)}")
+            
+            # The forecast frame doubles as the recommendation input, so it is built once
+            data_store["forecasts_df"] = _records_frame(data_store["forecasts"])
+            
+            # Generate recommendations
+            logger.info("Generating recommendations...")
+            try:
+                recommendations = await asyncio.to_thread(
+                    generate_recommendations, df, forecast_records, rules, data_store["forecasts_df"]
                 )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Service import failed: {str(e)}")
-
-        # Run forecasting pipeline
-        print("Starting forecasting pipeline...")
-        try:
-            forecast_result = run_all_forecasts(df)
-            forecast_records = forecast_result.get('forecast_data', []) if isinstance(forecast_result, dict) else (forecast_result or [])
-            model_metrics = forecast_result.get('model_metrics', []) if isinstance(forecast_result, dict) else []
-        except Exception as e:
-            print(f"Error in forecasting pipeline: {e}")
-            raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
-
-        # Store forecasts in memory
-        try:
-            for f in forecast_records:
-                data_store["forecasts"].append(f)
-            print(f"Stored {len(forecast_records)} forecast records in memory")
-        except Exception as e:
-            print(f"Error storing forecasts: {e}")
-            raise HTTPException(status_code=500, detail=f"Error storing forecast data: {str(e)}")
-
-        # Store model metrics in memory
-        try:
-            for m in model_metrics:
-                data_store["model_metrics"].append(m)
-            print(f"Stored {len(model_metrics)} metric entries in memory")
-        except Exception as e:
-            print(f"Error storing metrics: {e}")
-            raise HTTPException(status_code=500, detail=f"Error storing model metrics: {str(e)}")
-        
-        # Run MBA pipeline
-        print("Starting MBA pipeline...")
-        try:
-            rules = run_all_mba(df)
-            for r in rules:
-                data_store["mba_rules"].append(r)
-            print(f"Stored {len(rules)} MBA rules in memory")
-        except Exception as e:
-            print(f"Error in MBA pipeline: {e}")
-            raise HTTPException(status_code=500, detail=f"MBA pipeline failed: {str(e)}")
+                data_store["recommendations"] = list(recommendations)
+                _index_records("recommendations")
+                _index_recommendations()
+                logger.info("Stored %s recommendations in memory", len(recommendations))
+            except Exception as e:
+                logger.error("Error generating recommendations: %s", e)
+                raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
+            
+            data_store["mba_rules_df"] = _records_frame(data_store["mba_rules"])
+            data_store["model_metrics_df"] = _records_frame(data_store["model_metrics"])
+            data_store["forecasts_cols"] = _forecast_columns(data_store["forecasts_df"])
+            data_store["summary_tables"] = _build_summary_tables()
+
+            data_store["metadata"]["last_updated"] = datetime.now().isoformat()
+            data_store["version"] += 1
+            logger.info("Data processing completed successfully")
+            
+            return UploadResponse(
+                status="success",
+                message="Data processed successfully",
+                records=len(df)
+            )
         
-        # Generate recommendations
-        print("Generating recommendations...")
-        try:
-            recommendations = generate_recommendations(df, forecast_records, rules)
-            for rec in recommendations:
-                data_store["recommendations"].append(rec)
-            print(f"Stored {len(recommendations)} recommendations in memory")
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"Error generating recommendations: {e}")
-            raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
-        
-        data_store["metadata"]["last_updated"] = datetime.now().isoformat()
-        print("Data processing completed successfully")
-        
-        return UploadResponse(
-            status="success",
-            message="Data processed successfully",
-            records=len(df)
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Unexpected error in upload_data: {str(e)}")
-        print(f"Traceback: {error_trace}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Processing failed: {str(e)} - Check backend logs for details"
-        )
+            logger.exception("Unexpected error in upload_data: %s", e)
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Processing failed: {str(e)} - Check backend logs for details"
+            )
 
 
 # ============================================
@@ -283,93 +883,19 @@ async def get_dashboard_summary(
     pulau: Optional[str] = Query(None, description="Filter by island name for per-region summary")
 ):
     """Get dashboard summary metrics derived from in-memory data, optionally per pulau."""
-    forecasts = data_store["forecasts"]
-    recommendations = data_store["recommendations"]
-    rules = data_store["mba_rules"]
-    metrics = data_store["model_metrics"]
-
-    # Filter by pulau if provided
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecasts = [f for f in forecasts if (str(f.get('pulau', '')).strip().lower() == pulau_norm)]
-        recommendations = [r for r in recommendations if (str(r.get('pulau', '')).strip().lower() == pulau_norm)]
-        rules = [r for r in rules if (str(r.get('pulau', '')).strip().lower() == pulau_norm)]
-        metrics = [m for m in metrics if (str(m.get('pulau', '')).strip().lower() == pulau_norm)]
-
-    # Total Products → distinct product_category from forecasts
-    total_products = len({f.get('product_category') for f in forecasts}) if forecasts else 0
-    
-    # Total Islands → global count when not filtered; if filtered, 1 (or 0 when empty)
-    if pulau:
-        total_islands = 1 if forecasts else 0
-    else:
-        total_islands = len({f.get('pulau') for f in forecasts}) if forecasts else 0
-
-    # Stockout Risk → demand decreasing: next forecast < current forecast per (product_category, pulau)
-    stockout_risks = 0
-    if forecasts:
-        from collections import defaultdict
-        series = defaultdict(list)
-        for f in forecasts:
-            if f.get('is_forecast'):
-                series[(f.get('product_category'), f.get('pulau'))].append(f)
-        for (_, _), rows in series.items():
-            rows.sort(key=lambda r: r.get('week') or '')
-            if len(rows) >= 2:
-                cur = rows[-2]
-                nxt = rows[-1]
-                if (nxt.get('predicted') or 0) < (cur.get('predicted') or 0):
-                    stockout_risks += 1
-
-    # Bundling Opportunities → from MBA rules produced by the model
-    bundling_opportunities = len([r for r in rules if r.get('lift') is not None and r.get('lift', 0) >= 1.0])
-
-    # Model Accuracy → from ModelMetric (direct MAPE value); fallback to calculated if metrics absent
-    if metrics:
-        mape_vals = [m.get('mape') for m in metrics if m.get('mape') is not None]
-        accuracy = (sum(mape_vals) / len(mape_vals)) if mape_vals else 0.0
-    else:
-        historical = [f for f in forecasts if not f.get('is_forecast')]
-        if historical:
-            errs = []
-            for h in historical:
-                actual = h.get('actual')
-                predicted = h.get('predicted')
-                if actual and actual > 0 and predicted:
-                    errs.append(abs(actual - predicted) / actual)
-            accuracy = (sum(errs) / len(errs) * 100.0) if errs else 0.0
-        else:
-            accuracy = 0.0
-
-    return DashboardSummary(
-        total_products=total_products,
-        total_islands=total_islands,
-        stockout_risks=stockout_risks,
-        opportunities=bundling_opportunities,
-        forecast_accuracy=round(accuracy, 1)
-    )
+    # The cached dict already has the DashboardSummary shape; returning the
+    # response directly skips re-validating it (response_model stays for the docs)
+    return ORJSONResponse(_dashboard_summary(data_store["version"], pulau))
 
 
 @app.get("/training-metadata")
 async def get_training_metadata():
     """Get model training metadata."""
-    try:
-        # Count historical forecast records (as proxy for training volume)
-        forecasts = data_store["forecasts"]
-        total_trained = len([f for f in forecasts if not f.get('is_forecast')])
-        
-        return {
-            "last_trained": data_store["metadata"].get("last_updated") or datetime.now().isoformat(),
-            "total_records_trained": total_trained,
-            "model_version": "LightGBM v4.0.0"
-        }
-    except Exception as e:
-        print(f"Error in get_training_metadata: {e}")
-        return {
-            "last_trained": datetime.now().isoformat(),
-            "total_records_trained": 0,
-            "model_version": "LightGBM v4.0.0"
-        }
+    return {
+        "last_trained": data_store["metadata"].get("last_updated") or datetime.now().isoformat(),
+        "total_records_trained": data_store["metadata"]["total_records_trained"],
+        "model_version": "LightGBM v4.0.0"
+    }
 
 
 # ============================================
@@ -382,75 +908,15 @@ async def get_forecast(
     product: Optional[str] = Query(None, description="Filter by product category")
 ):
     """Get forecast data for charting."""
-    forecasts = data_store["forecasts"]
-    metrics = data_store["model_metrics"]
-
-    # Case-insensitive filtering
-    forecast_list = forecasts
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecast_list = [f for f in forecast_list if str(f.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        forecast_list = [f for f in forecast_list if product_norm in str(f.get('product_category', '')).strip().lower()]
-    
-    # Sort by week
-    forecast_list = sorted(forecast_list, key=lambda f: f.get('week', ''))
-
-    # If no forecast rows were found for the requested pulau+product combination,
-    # try a product-only fallback
-    if product and not forecast_list:
-        product_norm = product.strip().lower()
-        forecast_list = [f for f in data_store["forecasts"] if product_norm in str(f.get('product_category', '')).strip().lower()]
-        forecast_list = sorted(forecast_list, key=lambda f: f.get('week', ''))
-
-    # Format forecast list
-    formatted_forecasts = [
-        {
-            'week': f.get('week'),
-            'actual': f.get('actual'),
-            'predicted': f.get('predicted'),
-            'is_forecast': bool(f.get('is_forecast')),
-            'pulau': f.get('pulau'),
-            'product_category': f.get('product_category'),
-        }
-        for f in forecast_list
-    ]
-
-    # Get metrics (case-insensitive match)
-    metrics_list = metrics
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        metrics_list = [m for m in metrics_list if str(m.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        metrics_list = [m for m in metrics_list if product_norm in str(m.get('product_category', '')).strip().lower()]
+    # Case-insensitive filtering on the columnar forecasts
+    pulau_norm = _norm(pulau)
+    product_norm = _norm(product)
+    body = _forecast_body(data_store["version"], pulau_norm, product_norm)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
 
-    # Fallback: if caller requested a specific product but no metrics were found,
-    # try a product-only match
-    if product and not metrics_list:
-        product_norm = product.strip().lower()
-        metrics_list = [m for m in data_store["model_metrics"] if product_norm in str(m.get('product_category', '')).strip().lower()]
-
-    formatted_metrics = [
-        {
-            'pulau': m.get('pulau'),
-            'product_category': m.get('product_category'),
-            'mae': m.get('mae'),
-            'mape': m.get('mape'),
-            'sample_size': m.get('sample_size'),
-        }
-        for m in metrics_list
-    ]
-
-    return {
-        'forecast_data': formatted_forecasts,
-        'model_metrics': formatted_metrics,
-    }
+    cols, rows, metrics = _forecast_payload(pulau_norm, product_norm)
+    return StreamingResponse(_forecast_json_chunks(cols, rows, metrics), media_type="application/json")
 
 
 @app.get("/forecast/metrics")
@@ -459,19 +925,14 @@ async def get_forecast_metrics(
     product: Optional[str] = Query(None, description="Filter by product category")
 ):
     """Return stored model metrics for debugging."""
-    metrics = data_store["model_metrics"]
-
     # Filter by pulau and product
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        metrics = [m for m in metrics if str(m.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        metrics = [m for m in metrics if product_norm in str(m.get('product_category', '')).strip().lower()]
+    pulau_norm = _norm(pulau)
+    product_norm = _norm(product)
+    # Stored metrics, widened to the product alone when the pulau has none
+    metrics = _select_records("model_metrics", pulau_norm, product_norm, widen=True)
 
     if metrics:
-        return [
+        return ORJSONResponse([
             {
                 'pulau': m.get('pulau'),
                 'product_category': m.get('product_category'),
@@ -480,71 +941,52 @@ async def get_forecast_metrics(
                 'sample_size': m.get('sample_size'),
             }
             for m in sorted(metrics, key=lambda m: (m.get('pulau', ''), m.get('product_category', '')))
-        ]
-
-    # If product was requested but no metrics found for the given pulau,
-    # try returning any metrics that match the product across all pulau values.
-    if product:
-        product_norm = product.strip().lower()
-        alt_metrics = [m for m in data_store["model_metrics"] if product_norm in str(m.get('product_category', '')).strip().lower()]
-        if alt_metrics:
-            return [
-                {
-                    'pulau': m.get('pulau'),
-                    'product_category': m.get('product_category'),
-                    'mae': m.get('mae'),
-                    'mape': m.get('mape'),
-                    'sample_size': m.get('sample_size'),
-                }
-                for m in sorted(alt_metrics, key=lambda m: (m.get('pulau', ''), m.get('product_category', '')))
-            ]
+        ])
 
     # Fallback: compute metrics on-the-fly from historical Forecast rows
-    historical = [f for f in data_store["forecasts"] if not f.get('is_forecast')]
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        historical = [f for f in historical if str(f.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        historical = [f for f in historical if product_norm in str(f.get('product_category', '')).strip().lower()]
+    forecasts = data_store["forecasts_df"]
+    if forecasts is None:
+        return []
+
+    import pandas as pd
 
-    if not historical:
+    historical = forecasts[~forecasts['is_forecast'].astype(bool)]
+    if pulau_norm is not None:
+        historical = historical[historical['_pulau_key'] == pulau_norm]
+    if product_norm is not None:
+        historical = historical[historical['_prod_key'].str.contains(product_norm, regex=False)]
+
+    if historical.empty:
         return []
 
-    # Aggregate per (pulau, product_category)
-    agg = {}
-    for h in historical:
-        key = (h.get('pulau'), h.get('product_category'))
-        if key not in agg:
-            agg[key] = {
-                'errors': [],
-                'mape_vals': [],
-                'count': 0,
-            }
-        actual = h.get('actual')
-        predicted = h.get('predicted')
-        if actual is not None and predicted is not None:
-            err = abs((actual or 0) - (predicted or 0))
-            agg[key]['errors'].append(err)
-            if actual and actual != 0:
-                agg[key]['mape_vals'].append(abs((actual - predicted) / actual) * 100)
-        agg[key]['count'] += 1
-
-    results = []
-    for (pul, prod), v in agg.items():
-        mae = float(sum(v['errors']) / len(v['errors'])) if v['errors'] else 0.0
-        mape = float(sum(v['mape_vals']) / len(v['mape_vals'])) if v['mape_vals'] else 0.0
-        results.append({
+    # Aggregate per (pulau, product_category) in one groupby: rows missing
+    # actual or predicted count towards sample_size only, and MAPE skips
+    # zero actuals.
+    actual = historical['actual']
+    predicted = historical['predicted']
+    err = (actual - predicted).abs().where(actual.notna() & predicted.notna())
+    scored = pd.DataFrame({
+        'pulau': historical['pulau'],
+        'product_category': historical['product_category'],
+        'err': err,
+        'ape': (err / actual.where(actual != 0)).abs() * 100,
+    })
+    agg = (
+        scored.groupby(['pulau', 'product_category'], sort=False, dropna=False)
+        .agg(mae=('err', 'mean'), mape=('ape', 'mean'), sample_size=('err', 'size'))
+        .fillna(0.0)
+    )
+
+    return ORJSONResponse([
+        {
             'pulau': pul,
             'product_category': prod,
-            'mae': round(mae, 2),
-            'mape': round(mape, 2),
-            'sample_size': v['count'],
-        })
-
-    return results
+            'mae': round(float(mae), 2),
+            'mape': round(float(mape), 2),
+            'sample_size': int(count),
+        }
+        for (pul, prod), mae, mape, count in zip(agg.index, agg['mae'], agg['mape'], agg['sample_size'])
+    ])
 
 
 # ============================================
@@ -558,24 +1000,20 @@ async def get_mba_rules(
     limit: int = Query(50, description="Maximum number of rules to return")
 ):
     """Get Market Basket Analysis rules."""
-    rules = data_store["mba_rules"]
-    
-    if pulau:
-        rules = [r for r in rules if str(r.get('pulau', '')).strip() == pulau.strip()]
+    rules = _select_rules(_strip(pulau), min_lift, limit)
     
-    rules = [r for r in rules if r.get('lift', 0) >= min_lift]
-    rules = sorted(rules, key=lambda r: r.get('lift', 0), reverse=True)[:limit]
-    
-    return [
-        MBARuleResponse(
-            antecedents=r.get('antecedents', ''),
-            consequents=r.get('consequents', ''),
-            support=r.get('support', 0.0),
-            confidence=r.get('confidence', 0.0),
-            lift=r.get('lift', 0.0)
-        ) 
+    # Rows come from our own pipeline and already match MBARuleResponse, so
+    # they go straight to orjson (response_model is kept for the docs)
+    return ORJSONResponse([
+        {
+            'antecedents': r.get('antecedents', ''),
+            'consequents': r.get('consequents', ''),
+            'support': float(r.get('support', 0.0)),
+            'confidence': float(r.get('confidence', 0.0)),
+            'lift': float(r.get('lift', 0.0)),
+        }
         for r in rules
-    ]
+    ])
 
 
 # ============================================
@@ -589,26 +1027,21 @@ async def get_recommendations(
     priority: Optional[str] = Query(None, description="Filter by priority: high, medium, low")
 ):
     """Get DSS recommendations."""
-    recs = data_store["recommendations"]
-    
-    if pulau:
-        recs = [r for r in recs if str(r.get('pulau', '')).strip() == pulau.strip()]
-    if type:
-        recs = [r for r in recs if str(r.get('type', '')).strip() == type.strip()]
-    if priority:
-        recs = [r for r in recs if str(r.get('priority', '')).strip() == priority.strip()]
+    recs = _select_recommendations(_strip(pulau), type, priority)
     
-    return [
-        RecommendationResponse(
-            type=r.get('type', ''),
-            product=r.get('product', ''),
-            related_product=r.get('related_product'),
-            action=r.get('action', ''),
-            priority=r.get('priority', 'medium'),
-            confidence=r.get('confidence', 0.85)
-        ) 
-        for r in recs
-    ]
+    # Trusted in-memory rows, see get_mba_rules
+    rows = []
+    for r in recs:
+        conf = r.get('confidence', 0.85)
+        rows.append({
+            'type': r.get('type', ''),
+            'product': r.get('product', ''),
+            'related_product': r.get('related_product'),
+            'action': r.get('action', ''),
+            'priority': r.get('priority', 'medium'),
+            'confidence': None if conf is None else float(conf),
+        })
+    return ORJSONResponse(rows)
 
 
 # ============================================
@@ -618,21 +1051,13 @@ async def get_recommendations(
 @app.get("/islands", response_model=List[str])
 async def get_islands():
     """Get list of available islands/regions."""
-    forecasts = data_store["forecasts"]
-    islands = list(set(f.get('pulau') for f in forecasts if f.get('pulau')))
-    return sorted([i for i in islands if i])
+    return list(_island_names(data_store["version"]))
 
 
 @app.get("/products", response_model=List[str])
 async def get_products(pulau: Optional[str] = Query(None)):
     """Get list of available product categories."""
-    forecasts = data_store["forecasts"]
-    
-    if pulau:
-        forecasts = [f for f in forecasts if f.get('pulau') == pulau]
-    
-    products = list(set(f.get('product_category') for f in forecasts if f.get('product_category')))
-    return sorted([p for p in products if p])
+    return list(_product_names(data_store["version"], pulau or None))
 
 
 @app.get("/")
@@ -656,11 +1081,7 @@ async def health_check():
 @app.get("/api/debug/products")
 async def debug_products(pulau: Optional[str] = Query(None)):
     """Return distinct product_category values present in forecasts (for debugging)."""
-    forecasts = data_store["forecasts"]
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecasts = [f for f in forecasts if str(f.get('pulau', '')).strip().lower() == pulau_norm]
+    forecasts = _select_records("forecasts", _norm(pulau))
     
     products = list(set(f.get('product_category') for f in forecasts if f.get('product_category')))
     return [p for p in products if p]
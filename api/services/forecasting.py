@@ -7,8 +7,12 @@ Updates:
 - Returns structured dictionary: {'forecast_data': [...], 'model_metrics': [...]}
 """
 
+import logging
+import os
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from typing import List, Dict, Any, Tuple
 import warnings
@@ -16,10 +20,11 @@ import warnings
 # Library Machine Learning
 from lightgbm import LGBMRegressor
 from sklearn.multioutput import MultiOutputRegressor
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
@@ -31,6 +36,11 @@ def is_payday_week(date):
     if day >= 25 or day <= 5: return 1
     return 0
 
+def payday_mask(dates) -> np.ndarray:
+    """Versi vektor is_payday_week untuk array tanggal: 1 jika tanggal 25 s/d 5, selain itu 0"""
+    days = pd.DatetimeIndex(dates).day.to_numpy()
+    return ((days >= 25) | (days <= 5)).astype(np.int64)
+
 def prepare_island_data(df: pd.DataFrame, pulau: str) -> pd.DataFrame:
     df_subset = df[df['PULAU'] == pulau].copy()
     if df_subset.empty:
@@ -42,13 +52,16 @@ def prepare_island_data(df: pd.DataFrame, pulau: str) -> pd.DataFrame:
         pd.Grouper(key='InvoiceDate', freq='W'), 
         'PULAU', 
         'PRODUCT_CATEGORY'
-    ])['Quantity'].sum().reset_index()
+    ], observed=True)['Quantity'].sum().reset_index()
 
     df_pivot = df_grouped.pivot(index='InvoiceDate', columns=['PULAU', 'PRODUCT_CATEGORY'], values='Quantity')
     df_pivot = df_pivot.resample('W').asfreq().interpolate(method='linear').fillna(0)
     
-    df_stacked = df_pivot.stack(level=['PULAU', 'PRODUCT_CATEGORY']).reset_index()
+    # melt meratakan kolom (PULAU, PRODUCT_CATEGORY) tanpa lewat MultiIndex seperti stack
+    df_stacked = df_pivot.melt(value_name='Quantity', ignore_index=False).reset_index()
     df_stacked.columns = ['InvoiceDate', 'PULAU', 'PRODUCT_CATEGORY', 'Quantity']
+    # log1p sekali untuk seluruh kolom; tiap kategori cukup mengambil potongannya
+    df_stacked['Quantity_log'] = np.log1p(df_stacked['Quantity'].to_numpy())
     
     return df_stacked
 
@@ -64,15 +77,21 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
     forecasts = []
     metrics = []
     
-    X_train_all = []
-    y_train_all = []
+    X_blocks = []
+    payday_blocks = []
+    y_blocks = []
     meta_train = [] 
     
     cats_in_pulau = island_data['PRODUCT_CATEGORY'].unique()
+    # Baris per kategori (urut tanggal) dipisah sekali, dipakai ulang oleh semua tahap di bawah
+    by_category = {
+        cat: rows.sort_values('InvoiceDate')
+        for cat, rows in island_data.groupby('PRODUCT_CATEGORY', sort=False, observed=True)
+    }
     
     # --- A. BUILD TRAINING SET ---
     for category in cats_in_pulau:
-        sub_cat = island_data[island_data['PRODUCT_CATEGORY'] == category].sort_values('InvoiceDate')
+        sub_cat = by_category[category]
         series = sub_cat['Quantity'].values
         dates = sub_cat['InvoiceDate'].values
         
@@ -87,34 +106,28 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
                 'is_forecast': 0
             })
 
-        series_log = np.log1p(series)
+        series_log = sub_cat['Quantity_log'].values
         
-        # Sliding Window
-        for i in range(LOOK_BACK, len(series_log) - FORECAST_WEEKS + 1):
-            past_window = series_log[i-LOOK_BACK : i]
-            future_window = series_log[i : i+FORECAST_WEEKS]
-            
-            if len(future_window) < FORECAST_WEEKS: continue
-            
-            feat_mean = np.mean(past_window)
-            feat_std = np.std(past_window)
-            target_date = pd.to_datetime(dates[i])
-            feat_payday = is_payday_week(target_date)
-            
-            features = list(past_window) + [feat_mean, feat_std, feat_payday]
-            
-            X_train_all.append(features)
-            y_train_all.append(future_window)
-            meta_train.append(category)
+        # Sliding Window: semua window past/future sekaligus sebagai view 2-D
+        n_windows = len(series_log) - LOOK_BACK - FORECAST_WEEKS + 1
+        if n_windows <= 0:
+            continue
+        past = sliding_window_view(series_log, LOOK_BACK)[:n_windows]
+        future = sliding_window_view(series_log, FORECAST_WEEKS)[LOOK_BACK:LOOK_BACK + n_windows]
+        
+        X_blocks.append(np.column_stack([past, past.mean(axis=1), past.std(axis=1)]))
+        payday_blocks.append(payday_mask(dates[LOOK_BACK:LOOK_BACK + n_windows]))
+        y_blocks.append(future)
+        meta_train.extend([category] * n_windows)
 
-    if not X_train_all:
+    if not meta_train:
         # Not enough training samples to fit a model. Produce simple fallback
         # forecasts per category using a naive method (mean of last available values).
         future_start_date = island_data['InvoiceDate'].max() + timedelta(weeks=1)
         future_dates = pd.date_range(start=future_start_date, periods=FORECAST_WEEKS, freq='W')
 
         for category in cats_in_pulau:
-            sub_cat = island_data[island_data['PRODUCT_CATEGORY'] == category].sort_values('InvoiceDate')
+            sub_cat = by_category[category]
             series = sub_cat['Quantity'].values
             if len(series) == 0:
                 # no data to base a forecast on
@@ -139,13 +152,17 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
 
     # --- B. TRAINING ---
     feat_cols = [f'Lag_{j}' for j in range(LOOK_BACK, 0, -1)] + ['Mean', 'Std', 'Is_Payday']
-    X_df = pd.DataFrame(X_train_all, columns=feat_cols)
-    X_df['CATEGORY'] = pd.Categorical(meta_train, categories=cats_in_pulau)
-    y_arr = np.array(y_train_all)
+    X_df = pd.DataFrame(np.concatenate(X_blocks), columns=feat_cols[:-1])
+    X_df['Is_Payday'] = np.concatenate(payday_blocks)
+    # Kategori sebagai kode integer (posisi di cats_in_pulau) + categorical_feature
+    # eksplisit, tanpa dtype Categorical pandas di jalur fit/predict
+    category_codes = {cat: code for code, cat in enumerate(cats_in_pulau)}
+    X_df['CATEGORY'] = pd.Categorical(meta_train, categories=cats_in_pulau).codes.astype(np.int32)
+    y_arr = np.concatenate(y_blocks)
 
     lgbm = LGBMRegressor(n_estimators=1000, learning_rate=0.05, num_leaves=20, n_jobs=1, verbose=-1)
     model = MultiOutputRegressor(lgbm)
-    model.fit(X_df, y_arr)
+    model.fit(X_df, y_arr, categorical_feature=['CATEGORY'])
 
     # --- C. CALCULATE METRICS (IN-SAMPLE) ---
     # Prediksi ulang data training untuk melihat seberapa baik model "belajar"
@@ -153,34 +170,33 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
     y_pred_train = np.expm1(y_pred_log_train)
     y_true_train = np.expm1(y_arr)
 
-    # Hitung error per kategori
-    # Kita harus map balik index X_df ke kategori
-    for cat in cats_in_pulau:
-        # Ambil index baris yang sesuai kategori ini
-        indices = [i for i, x in enumerate(meta_train) if x == cat]
-        
-        if not indices:
+    # Hitung error per kategori sekaligus: jumlahkan error per baris lalu
+    # agregasi per kode CATEGORY dengan bincount
+    codes = X_df['CATEGORY'].to_numpy()
+    n_cats = len(cats_in_pulau)
+    abs_err = np.abs(y_true_train - y_pred_train)
+    nonzero = y_true_train != 0
+    abs_pct = np.where(nonzero, abs_err / np.where(nonzero, y_true_train, 1.0), 0.0)
+    
+    row_counts = np.bincount(codes, minlength=n_cats)
+    err_sums = np.bincount(codes, weights=abs_err.sum(axis=1), minlength=n_cats)
+    pct_sums = np.bincount(codes, weights=abs_pct.sum(axis=1), minlength=n_cats)
+    nonzero_counts = np.bincount(codes, weights=nonzero.sum(axis=1), minlength=n_cats)
+    
+    for code, cat in enumerate(cats_in_pulau):
+        if not row_counts[code]:
             continue
-            
-        y_true_cat = y_true_train[indices].flatten()
-        y_pred_cat = y_pred_train[indices].flatten()
-        
-        # Hitung Metrics
-        mae = mean_absolute_error(y_true_cat, y_pred_cat)
         
-        # Safe MAPE (handle division by zero)
-        mask = y_true_cat != 0
-        if np.sum(mask) > 0:
-            mape = np.mean(np.abs((y_true_cat[mask] - y_pred_cat[mask]) / y_true_cat[mask]))
-        else:
-            mape = 0.0
+        mae = err_sums[code] / (row_counts[code] * FORECAST_WEEKS)
+        # Safe MAPE (hanya target non-nol)
+        mape = pct_sums[code] / nonzero_counts[code] if nonzero_counts[code] > 0 else 0.0
             
         metrics.append({
             'pulau': pulau,
             'product_category': cat,
             'mae': round(float(mae), 2),
             'mape': round(float(mape * 100), 2), # Dalam Persen
-            'sample_size': len(indices)
+            'sample_size': int(row_counts[code])
         })
 
     # --- D. FORECASTING FUTURE ---
@@ -188,9 +204,8 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
     future_dates = pd.date_range(start=future_start_date, periods=FORECAST_WEEKS, freq='W')
 
     for category in cats_in_pulau:
-        sub_cat = island_data[island_data['PRODUCT_CATEGORY'] == category].sort_values('InvoiceDate')
-        last_series = sub_cat['Quantity'].values[-LOOK_BACK:]
-        last_series_log = np.log1p(last_series)
+        sub_cat = by_category[category]
+        last_series_log = sub_cat['Quantity_log'].values[-LOOK_BACK:]
         
         feat_mean = np.mean(last_series_log)
         feat_std = np.std(last_series_log)
@@ -199,7 +214,7 @@ def train_forecast_model(df: pd.DataFrame, pulau: str) -> Tuple[List[Dict], List
         features = list(last_series_log) + [feat_mean, feat_std, feat_payday]
         
         input_row = pd.DataFrame([features], columns=feat_cols)
-        input_row['CATEGORY'] = pd.Categorical([category], categories=cats_in_pulau)
+        input_row['CATEGORY'] = np.array([category_codes[category]], dtype=np.int32)
         
         pred_log = model.predict(input_row)[0]
         pred_final = np.expm1(pred_log)
@@ -225,7 +240,6 @@ def run_all_forecasts(df: pd.DataFrame) -> Dict[str, List[Any]]:
         'model_metrics': [...]  # Data untuk tabel akurasi
     }
     """
-    import traceback
     all_forecasts = []
     all_metrics = []
     
@@ -234,22 +248,34 @@ def run_all_forecasts(df: pd.DataFrame) -> Dict[str, List[Any]]:
             df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
             
         islands = df['PULAU'].unique()
-        print(f"Found {len(islands)} islands: {islands}")
+        logger.info("Found %s islands: %s", len(islands), list(islands))
         
-        for pulau in islands:
-            print(f"Training forecast model for: {pulau}")
-            try:
-                forecasts, metrics = train_forecast_model(df, pulau)
-                all_forecasts.extend(forecasts)
-                all_metrics.extend(metrics)
-                print(f"  Generated {len(forecasts)} records & {len(metrics)} metrics")
-            except Exception as e:
-                print(f"  Error training {pulau}: {str(e)}")
-                print(f"  Traceback: {traceback.format_exc()}")
-                raise
-    except Exception as e:
-        print(f"Critical error in run_all_forecasts: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        # Satu kali groupby untuk semua pulau (urutan sama dengan unique())
+        island_groups = list(df.groupby('PULAU', sort=False, observed=True))
+        
+        # LightGBM melatih di kode native tanpa memegang GIL (n_jobs=1 per model),
+        # jadi tiap pulau bisa dilatih paralel di thread tanpa pickle DataFrame
+        workers = max(1, min(len(island_groups), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            jobs = []
+            for pulau, island_df in island_groups:
+                logger.info("Training forecast model for: %s", pulau)
+                jobs.append((pulau, pool.submit(train_forecast_model, island_df, pulau)))
+            
+            # Collect in island order so the output matches a sequential run
+            for pulau, job in jobs:
+                try:
+                    forecasts, metrics = job.result()
+                    all_forecasts.extend(forecasts)
+                    all_metrics.extend(metrics)
+                    logger.info("%s: generated %s records & %s metrics", pulau, len(forecasts), len(metrics))
+                except Exception:
+                    logger.exception("Error training %s", pulau)
+                    for _, pending in jobs:
+                        pending.cancel()
+                    raise
+    except Exception:
+        logger.exception("Critical error in run_all_forecasts")
         raise
     
     return {
@@ -11,8 +11,11 @@ Fitur Utama:
 3. FP-Growth Algorithm untuk performa cepat.
 """
 
+import logging
+import numpy as np
 import pandas as pd
 import warnings
+from scipy import sparse
 from typing import List, Dict, Any
 
 # Library MBA
@@ -20,23 +23,40 @@ from mlxtend.frequent_patterns import fpgrowth, association_rules
 
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 def clean_data_for_mba(df: pd.DataFrame) -> pd.DataFrame:
     """
     Membersihkan data transaksi sebelum proses MBA.
     """
-    df_clean = df.copy()
-    
-    # 1. Pastikan InvoiceNo string dan valid
-    df_clean.dropna(axis=0, subset=['InvoiceNo'], inplace=True)
-    df_clean['InvoiceNo'] = df_clean['InvoiceNo'].astype(str)
-    
-    # 2. Hapus transaksi return/negatif
-    df_clean = df_clean[df_clean['Quantity'] > 0]
+    # 1. Buang InvoiceNo kosong dan 2. transaksi return/negatif dalam satu mask
+    filtered = df.loc[df['InvoiceNo'].notna() & (df['Quantity'] > 0)]
     
-    # 3. Bersihkan spasi di nama produk
-    df_clean['PRODUCT_CATEGORY'] = df_clean['PRODUCT_CATEGORY'].astype(str).str.strip()
-    
-    return df_clean
+    # 3. Bersihkan spasi di nama produk. assign() mengganti kolom pada frame
+    # baru (df asli tidak ikut berubah) tanpa df.copy() penuh sebelumnya
+    return filtered.assign(
+        InvoiceNo=filtered['InvoiceNo'].astype(str),
+        PRODUCT_CATEGORY=filtered['PRODUCT_CATEGORY'].astype(str).str.strip(),
+    )
+
+def _basket_sets(invoices: np.ndarray, cat_codes: np.ndarray, categories: pd.Index) -> pd.DataFrame:
+    """
+    Matrix boolean sparse InvoiceNo x PRODUCT_CATEGORY untuk FP-Growth.
+
+    `invoices` adalah InvoiceNo per baris, `cat_codes` kode kategori per
+    baris (0..len(categories)-1, urutan label sudah terurut). Sama dengan
+    pivot_table(sum Quantity) > 0 karena clean_data_for_mba sudah membuang
+    Quantity <= 0: sel bernilai True jika kombinasi invoice/kategori
+    muncul. Baris dan kolom diurutkan seperti pivot_table.
+    """
+    inv_codes, invoice_labels = pd.factorize(invoices, sort=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(inv_codes), dtype=bool), (inv_codes, cat_codes)),
+        shape=(len(invoice_labels), len(categories)),
+    )
+    matrix.sum_duplicates()
+    return pd.DataFrame.sparse.from_spmatrix(matrix, columns=categories)
+
 
 def run_market_basket_analysis(
     df: pd.DataFrame, 
@@ -51,67 +71,64 @@ def run_market_basket_analysis(
     Args:
         min_item_occurence: Barang yg muncul kurang dari x kali akan dibuang (Optimasi RAM).
     """
-    print(f"\n🛒 Memproses Market Basket: {pulau}...")
+    logger.info("Memproses Market Basket: %s", pulau)
     
     # A. Filter Data per Pulau
-    island_data = df[df['PULAU'] == pulau].copy()
+    island_data = df[df['PULAU'] == pulau]
     
     if island_data.empty:
-        print("   -> Data kosong.")
+        logger.info("%s: data kosong", pulau)
         return []
 
     # --- OPTIMASI MEMORI 1: PRUNING BARANG JARANG LAKU ---
     # Membuang item yang total kemunculannya sedikit sebelum masuk matriks
-    item_counts = island_data['PRODUCT_CATEGORY'].value_counts()
-    valid_items = item_counts[item_counts >= min_item_occurence].index
-    island_data = island_data[island_data['PRODUCT_CATEGORY'].isin(valid_items)]
+    # Dihitung pada kode integer kategori (bincount), bukan value_counts string
+    cat_codes, categories = pd.factorize(island_data['PRODUCT_CATEGORY'], sort=True)
+    keep = np.bincount(cat_codes, minlength=len(categories)) >= min_item_occurence
+    rows = keep[cat_codes]
 
-    if island_data.empty:
-        print(f"   -> Data kosong setelah pruning item < {min_item_occurence} transaksi.")
+    if not rows.any():
+        logger.info("%s: data kosong setelah pruning item < %s transaksi", pulau, min_item_occurence)
         return []
 
-    # B. Membuat Basket (Pivot Table)
-    # Pivot table lebih stabil memorinya daripada groupby().unstack()
-    basket = island_data.pivot_table(
-        index='InvoiceNo', 
-        columns='PRODUCT_CATEGORY', 
-        values='Quantity', 
-        aggfunc='sum'
-    ).fillna(0)
-
-    # --- OPTIMASI MEMORI 2: UBAH KE BOOLEAN ---
-    # Mengubah angka menjadi True/False (1 bit) vs Int64/Float (64 bit)
-    basket_sets = basket.applymap(lambda x: True if x > 0 else False)
+    # B. Membuat Basket (Sparse Boolean Matrix)
+    # Hanya sel yang terisi yang disimpan: O(nnz), bukan invoice x kategori.
+    # Kode kategori yang tersisa dinomori ulang 0..k-1 dengan urutan tetap.
+    basket_sets = _basket_sets(
+        island_data['InvoiceNo'].to_numpy()[rows],
+        (np.cumsum(keep) - 1)[cat_codes[rows]],
+        categories[keep],
+    )
 
     # Hapus item 'POSTAGE' jika ada (biasanya pengotor)
     if 'POSTAGE' in basket_sets.columns:
         basket_sets.drop('POSTAGE', inplace=True, axis=1)
 
-    print(f"   -> Dimensi Matrix: {basket_sets.shape}")
+    logger.debug("%s: dimensi matrix %s", pulau, basket_sets.shape)
 
     # C. Algoritma FP-GROWTH
     try:
         frequent_itemsets = fpgrowth(basket_sets, min_support=min_support, use_colnames=True)
     except MemoryError:
-        print("   ❌ Memory Error saat FP-Growth. Coba naikkan min_support.")
+        logger.error("%s: Memory Error saat FP-Growth. Coba naikkan min_support.", pulau)
         return []
-    except Exception as e:
-        print(f"   ❌ Error saat FP-Growth: {str(e)}")
+    except Exception:
+        logger.exception("%s: error saat FP-Growth", pulau)
         return []
 
     if frequent_itemsets.empty:
-        print("   -> Tidak ada itemset yang memenuhi support.")
+        logger.info("%s: tidak ada itemset yang memenuhi support", pulau)
         return []
 
     # D. Generate Association Rules
     try:
         rules_df = association_rules(frequent_itemsets, metric="lift", min_threshold=min_lift)
     except ValueError:
-        print("   -> Gagal generate rules (mungkin data terlalu sedikit).")
+        logger.info("%s: gagal generate rules (mungkin data terlalu sedikit)", pulau)
         return []
 
     if rules_df.empty:
-        print("   -> Tidak ada rules yang memenuhi threshold lift.")
+        logger.info("%s: tidak ada rules yang memenuhi threshold lift", pulau)
         return []
 
     # E. Formatting Output
@@ -119,22 +136,30 @@ def run_market_basket_analysis(
     rules_df = rules_df.sort_values(['lift', 'confidence'], ascending=[False, False])
     
     # Konversi frozenset ke string clean
-    rules_df['antecedents'] = rules_df['antecedents'].apply(lambda x: ', '.join(list(x)))
-    rules_df['consequents'] = rules_df['consequents'].apply(lambda x: ', '.join(list(x)))
+    rules_df['antecedents'] = [', '.join(x) for x in rules_df['antecedents']]
+    rules_df['consequents'] = [', '.join(x) for x in rules_df['consequents']]
 
-    # Convert to List of Dicts
-    rules_list = []
-    for _, row in rules_df.iterrows():
-        rules_list.append({
+    # Convert to List of Dicts: zip kolom (tanpa iterrows); round() Python
+    # dipertahankan karena DataFrame.round bisa beda di digit terakhir
+    rules_list = [
+        {
             'pulau': pulau,
-            'antecedents': row['antecedents'],
-            'consequents': row['consequents'],
-            'support': round(row['support'], 4),
-            'confidence': round(row['confidence'], 4),
-            'lift': round(row['lift'], 4)
-        })
-
-    print(f"   -> Ditemukan {len(rules_list)} rules.")
+            'antecedents': antecedents,
+            'consequents': consequents,
+            'support': round(support, 4),
+            'confidence': round(confidence, 4),
+            'lift': round(lift, 4)
+        }
+        for antecedents, consequents, support, confidence, lift in zip(
+            rules_df['antecedents'],
+            rules_df['consequents'],
+            rules_df['support'].tolist(),
+            rules_df['confidence'].tolist(),
+            rules_df['lift'].tolist(),
+        )
+    ]
+
+    logger.debug("%s: ditemukan %s rules", pulau, len(rules_list))
     return rules_list # Mengembalikan max 100 rules terbaik jika mau dibatasi: rules_list[:100]
 
 
@@ -142,60 +167,57 @@ def run_all_mba(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Menjalankan MBA untuk semua pulau dengan Data Preprocessing terpusat.
     """
-    import traceback
-    
     try:
-        print("=== START MARKET BASKET ANALYSIS PIPELINE ===")
+        logger.info("Starting market basket analysis pipeline")
         
         # 1. Global Cleaning
         try:
             df_clean = clean_data_for_mba(df)
-            print(f"Total Transaksi Bersih: {len(df_clean)}")
-        except Exception as e:
-            print(f"❌ Error during data cleaning: {str(e)}")
-            print(traceback.format_exc())
+            logger.info("Total transaksi bersih: %s", len(df_clean))
+        except Exception:
+            logger.exception("Error during data cleaning")
             raise
         
         all_rules = []
         islands = df_clean['PULAU'].unique()
-        print(f"Processing {len(islands)} islands: {list(islands)}")
+        logger.info("Processing %s islands: %s", len(islands), list(islands))
         
         # Konfigurasi Threshold
         # Diset agak longgar agar dapat hasil dulu, nanti bisa difilter di dashboard
         MIN_SUPPORT = 0.1  # 10% Support (Sesuaikan dengan volume data)
         MIN_LIFT = 2.0
         
-        for pulau in islands:
+        # Satu kali groupby untuk semua pulau (urutan sama dengan unique())
+        for pulau, island_df in df_clean.groupby('PULAU', sort=False):
             try:
-                print(f"\nProcessing pulau: {pulau}")
                 rules = run_market_basket_analysis(
-                    df_clean, 
+                    island_df, 
                     pulau, 
                     min_support=MIN_SUPPORT, 
                     min_lift=MIN_LIFT
                 )
-                print(f"  ✓ Generated {len(rules)} rules for {pulau}")
+                logger.info("Generated %s rules for %s", len(rules), pulau)
                 all_rules.extend(rules)
-            except Exception as e:
-                print(f"❌ Error processing island {pulau}: {str(e)}")
-                print(traceback.format_exc())
+            except Exception:
+                logger.exception("Error processing island %s", pulau)
                 raise
         
         # Global Summary
         if all_rules:
-            df_res = pd.DataFrame(all_rules)
-            print("\n=== TOP 10 RULES TERKUAT (GLOBAL) ===")
-            print(df_res[['pulau', 'antecedents', 'consequents', 'confidence', 'lift']]
-                  .sort_values(by='lift', ascending=False)
-                  .head(10)
-                  .to_string(index=False))
-            print(f"\n✓ MBA Pipeline complete: {len(all_rules)} total rules generated")
+            # Tabel hanya dirender jika level DEBUG aktif
+            if logger.isEnabledFor(logging.DEBUG):
+                df_res = pd.DataFrame(all_rules)
+                logger.debug("TOP 10 RULES TERKUAT (GLOBAL):\n%s",
+                             df_res[['pulau', 'antecedents', 'consequents', 'confidence', 'lift']]
+                             .sort_values(by='lift', ascending=False)
+                             .head(10)
+                             .to_string(index=False))
+            logger.info("MBA Pipeline complete: %s total rules generated", len(all_rules))
         else:
-            print("\n⚠️ Warning: No rules generated from any island")
+            logger.warning("No rules generated from any island")
             
         return all_rules
         
-    except Exception as e:
-        print(f"\n❌ FATAL ERROR in run_all_mba: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception("Fatal error in run_all_mba")
         raise
\ No newline at end of file
@@ -2,11 +2,19 @@
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import asyncio
+import logging
+import numpy as np
+import orjson
 import pandas as pd
-from io import BytesIO
+import heapq
+from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 import os
+import sys
 
 from schemas import (
     UserCreate, UserResponse, ForecastResponse, MBARuleResponse, 
@@ -27,39 +35,57 @@ data_store: Dict[str, Any] = {
     "mba_rules": [],
     "recommendations": [],
     "model_metrics": [],
+    "forecasts_df": None,
+    "mba_rules_df": None,
+    "model_metrics_df": None,
+    "indexes": {},
+    "forecasts_cols": None,
+    "summary_tables": None,
     "user": None,
+    "version": 0,
     "metadata": {
         "last_updated": None,
         "upload_timestamp": None,
+        "total_records_trained": 0,
     }
 }
 
+# This module's and the services package's loggers write to stdout at LOG_LEVEL;
+# the root logger and third-party loggers are left to the server
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+for _name in (__name__, run_all_forecasts.__module__.rsplit('.', 1)[0]):
+    _app_logger = logging.getLogger(_name)
+    _app_logger.setLevel(LOG_LEVEL)
+    if not _app_logger.handlers:
+        _app_logger.addHandler(_log_handler)
+    _app_logger.propagate = False
+logger = logging.getLogger(__name__)
+
+# Serializes uploads now that the pipeline stages run in worker threads
+_upload_lock = asyncio.Lock()
+
 app = FastAPI(
     title="DataNiaga API",
     description="Retail Decision Support System - AI-powered forecasting and recommendations",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
 )
 
-# CORS configuration
+# CORS configuration: explicit ALLOWED_ORIGINS list, else Vercel deployments and local dev servers
+ALLOWED_ORIGIN_REGEX = r"https://([a-z0-9-]+\.)*vercel\.app|http://(localhost|127\.0\.0\.1):(3000|5173|8080)"
 allowed_origins_env = os.getenv("ALLOWED_ORIGINS", "").strip()
-if allowed_origins_env:
-    allowed_origins = [o.strip() for o in allowed_origins_env.split(",") if o.strip()]
-else:
-    allowed_origins = [
-        "http://localhost:5173",
-        "http://localhost:3000",
-        "http://localhost:8080",
-        "http://127.0.0.1:8080",
-        "http://127.0.0.1:5173",
-        "http://127.0.0.1:3000",
-        "*",
-    ]
+allowed_origins = [o.strip() for o in allowed_origins_env.split(",") if o.strip()]
 
+# Starlette builds the middleware stack lazily on the first request it serves,
+# so registering CORS at import time adds nothing to health-check cold starts.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
+    allow_origin_regex=None if allowed_origins else ALLOWED_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -67,16 +93,382 @@ app.add_middleware(
 )
 
 REQUIRED_COLUMNS = ['InvoiceNo', 'InvoiceDate', 'PULAU', 'PRODUCT_CATEGORY', 'Quantity']
+REQUIRED_COLUMNS_SET = frozenset(REQUIRED_COLUMNS)
+FAST_IO = os.getenv("DATANIAGA_FAST_IO", "").strip() == "1"
 
 
 def validate_dataframe(df: pd.DataFrame) -> None:
     """Validate required columns exist in DataFrame"""
+    if REQUIRED_COLUMNS_SET.issubset(df.columns):
+        return
     missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Missing required columns: {', '.join(missing)}"
+    raise HTTPException(
+        status_code=400, 
+        detail=f"Missing required columns: {', '.join(missing)}"
+    )
+
+
+def _read_upload(reader, source, fast_engine: Optional[str] = None) -> pd.DataFrame:
+    """Parse only the required columns of an upload, trying `fast_engine` first when DATANIAGA_FAST_IO=1"""
+    if FAST_IO and fast_engine:
+        try:
+            return reader(source, engine=fast_engine, usecols=REQUIRED_COLUMNS)
+        except ImportError:
+            # Engine not installed: rewind and use pandas' default parser
+            source.seek(0)
+    # pandas raises a ValueError naming any required column the file lacks
+    return reader(source, usecols=REQUIRED_COLUMNS)
+
+
+@lru_cache(maxsize=512)
+def _norm(value: Optional[str]) -> Optional[str]:
+    """Normalize a query filter to the `_pulau_key`/`_prod_key` form; None when absent"""
+    return value.strip().lower() if value else None
+
+
+@lru_cache(maxsize=512)
+def _strip(value: Optional[str]) -> Optional[str]:
+    """Stripped, case-preserved query filter for the exact-match endpoints; None when absent"""
+    return value.strip() if value else None
+
+
+@lru_cache(maxsize=1024, typed=True)
+def _record_key(value: Any) -> str:
+    """Stripped, lowercased filter key for a stored pulau/product_category value (few distinct values)"""
+    return str(value).strip().lower()
+
+
+def _index_records(name: str) -> None:
+    """Attach normalized `_pulau_key`/`_prod_key` fields to `data_store[name]` and rebuild its inverted index"""
+    by_pulau = defaultdict(list)
+    by_product = defaultdict(list)
+    for i, r in enumerate(data_store[name]):
+        r['_pulau_key'] = _record_key(r.get('pulau', ''))
+        by_pulau[r['_pulau_key']].append(i)
+        if 'product_category' in r:
+            r['_prod_key'] = _record_key(r.get('product_category', ''))
+            by_product[r['_prod_key']].append(i)
+    data_store["indexes"][name] = {"pulau": dict(by_pulau), "product": dict(by_product)}
+
+
+def _select_records(
+    name: str,
+    pulau_norm: Optional[str] = None,
+    product_norm: Optional[str] = None,
+    widen: bool = False,
+) -> List[Dict[str, Any]]:
+    """Stored-order records matching exact pulau / substring product keys; `widen` retries product-only"""
+    records = data_store[name]
+    if pulau_norm is None and product_norm is None:
+        return records
+
+    index = data_store["indexes"].get(name)
+    if index is None:
+        return []
+
+    if pulau_norm is not None:
+        rows = [records[i] for i in index["pulau"].get(pulau_norm, [])]
+        if product_norm is not None:
+            rows = [r for r in rows if product_norm in r['_prod_key']]
+        if rows or not widen or product_norm is None:
+            return rows
+
+    buckets = [pos for key, pos in index["product"].items() if product_norm in key]
+    return [records[i] for i in heapq.merge(*buckets)]
+
+
+def _index_recommendations() -> None:
+    """Add stripped `pulau_exact` / `type` / `priority` value -> positions buckets to the recommendations index"""
+    index = data_store["indexes"]["recommendations"]
+    for name, field in (("pulau_exact", "pulau"), ("type", "type"), ("priority", "priority")):
+        buckets = defaultdict(list)
+        for i, r in enumerate(data_store["recommendations"]):
+            buckets[str(r.get(field, '')).strip()].append(i)
+        index[name] = dict(buckets)
+
+
+def _select_recommendations(
+    pulau: Optional[str],
+    rec_type: Optional[str],
+    priority: Optional[str],
+) -> List[Dict[str, Any]]:
+    """Stored-order recommendations matching exact stripped pulau / type / priority (empty = any)"""
+    records = data_store["recommendations"]
+    index = data_store["indexes"].get("recommendations")
+    if index is None:
+        return records if pulau is None and not rec_type and not priority else []
+
+    positions = None
+    if pulau is not None:
+        positions = index["pulau_exact"].get(pulau, [])
+    for field, value in (("type", rec_type), ("priority", priority)):
+        if value:
+            bucket = index[field].get(value.strip(), [])
+            positions = bucket if positions is None else sorted(set(positions).intersection(bucket))
+    return records if positions is None else [records[i] for i in positions]
+
+
+def _index_rules_by_lift() -> None:
+    """Add `by_lift` to the mba_rules index: per stripped pulau (None = all) positions by descending lift"""
+    rules = data_store["mba_rules"]
+    index = data_store["indexes"]["mba_rules"]
+
+    def by_lift(positions):
+        return sorted(positions, key=lambda i: rules[i].get('lift', 0), reverse=True)
+
+    by_pulau = defaultdict(list)
+    for i, r in enumerate(rules):
+        by_pulau[str(r.get('pulau', '')).strip()].append(i)
+    ordered = {key: by_lift(positions) for key, positions in by_pulau.items()}
+    ordered[None] = by_lift(range(len(rules)))
+    index["by_lift"] = ordered
+
+
+def _select_rules(pulau: Optional[str], min_lift: float, limit: int) -> List[Dict[str, Any]]:
+    """Up to `limit` rules with lift >= min_lift, best first, stopping early on the lift-ordered index"""
+    rules = data_store["mba_rules"]
+    ordered = data_store["indexes"].get("mba_rules", {}).get("by_lift", {}).get(pulau, [])
+    selected = []
+    for i in ordered:
+        if len(selected) == limit or rules[i].get('lift', 0) < min_lift:
+            break
+        selected.append(rules[i])
+    # A negative limit never stops the walk; the slice then drops the last
+    # |limit| rules, as the original sorted(...)[:limit] did
+    return selected[:limit]
+
+
+@lru_cache(maxsize=64)
+def _island_names(version: int) -> tuple:
+    """Sorted distinct island names from the per-series summary table; keyed on data_store["version"]"""
+    series = (data_store["summary_tables"] or {}).get("series")
+    if series is None:
+        return ()
+    return tuple(sorted(set(i for i in series['pulau'].dropna() if i)))
+
+
+@lru_cache(maxsize=64)
+def _product_names(version: int, pulau: Optional[str]) -> tuple:
+    """Sorted distinct product categories, optionally for one exact island name, cached per data version"""
+    series = (data_store["summary_tables"] or {}).get("series")
+    if series is None:
+        return ()
+    if pulau is not None:
+        series = series[series['pulau'] == pulau]
+    return tuple(sorted(set(p for p in series['product_category'].dropna() if p)))
+
+
+def _records_frame(records: List[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    """Build a DataFrame from keyed records for vectorized read queries"""
+    if not records:
+        return None
+    frame = pd.DataFrame(records)
+    return frame
+
+
+def _forecast_columns(frame: Optional[pd.DataFrame]) -> Optional[Dict[str, Any]]:
+    """Lay forecasts out as NumPy columns: factorized pulau/product keys, week order, ISO weeks and values"""
+    if frame is None:
+        return None
+    pulau_codes, pulau_levels = pd.factorize(frame['_pulau_key'])
+    product_codes, product_levels = pd.factorize(frame['_prod_key'])
+    week_codes, week_levels = pd.factorize(frame['week'], use_na_sentinel=False)
+    return {
+        "pulau_codes": pulau_codes,
+        "pulau_lookup": {key: code for code, key in enumerate(pulau_levels)},
+        "product_codes": product_codes,
+        "product_levels": np.asarray(product_levels, dtype=str),
+        "series_codes": frame.groupby(['product_category', 'pulau'], sort=False, dropna=False).ngroup().to_numpy(),
+        "order": np.argsort(frame['week'].to_numpy(), kind='stable'),
+        "week": np.array([w.isoformat() for w in week_levels], dtype=object)[week_codes],
+        "actual": frame['actual'].to_numpy(dtype=float),
+        "predicted": frame['predicted'].to_numpy(dtype=float),
+        "is_forecast": frame['is_forecast'].to_numpy().astype(bool),
+        "pulau": frame['pulau'].to_numpy(dtype=object),
+        "product_category": frame['product_category'].to_numpy(dtype=object),
+    }
+
+
+def _forecast_rows(
+    cols: Optional[Dict[str, Any]],
+    pulau_norm: Optional[str],
+    product_norm: Optional[str],
+    widen: bool = False,
+) -> np.ndarray:
+    """Week-ordered positions of forecast rows matching the filters, with `widen` as in _select_records"""
+    if cols is None:
+        return np.empty(0, dtype=np.intp)
+    order = cols["order"]
+    mask = np.ones(len(order), dtype=bool)
+    if product_norm is not None:
+        level_match = np.char.find(cols["product_levels"], product_norm) >= 0
+        mask &= level_match[cols["product_codes"]]
+    if pulau_norm is not None:
+        pulau_mask = mask & (cols["pulau_codes"] == cols["pulau_lookup"].get(pulau_norm, -1))
+        if pulau_mask.any() or not widen or product_norm is None:
+            mask = pulau_mask
+    return order[mask[order]]
+
+
+def _format_forecast_rows(cols: Optional[Dict[str, Any]], rows: np.ndarray) -> List[Dict[str, Any]]:
+    """Build /api/forecast response dicts for the given row positions only"""
+    if cols is None or not len(rows):
+        return []
+    actual = cols["actual"][rows]
+    return [
+        {
+            'week': week,
+            'actual': None if a != a else a,
+            'predicted': predicted,
+            'is_forecast': is_forecast,
+            'pulau': pul,
+            'product_category': prod,
+        }
+        for week, a, predicted, is_forecast, pul, prod in zip(
+            cols["week"][rows].tolist(),
+            actual.tolist(),
+            cols["predicted"][rows].tolist(),
+            cols["is_forecast"][rows].tolist(),
+            cols["pulau"][rows].tolist(),
+            cols["product_category"][rows].tolist(),
         )
+    ]
+
+
+FORECAST_STREAM_CHUNK = 2000
+
+
+def _forecast_json_chunks(cols: Dict[str, Any], rows: np.ndarray, metrics: List[Dict[str, Any]]):
+    """Yield the /api/forecast JSON body (same bytes as ORJSONResponse), serializing rows a chunk at a time"""
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    yield b'{"forecast_data":['
+    for start in range(0, len(rows), FORECAST_STREAM_CHUNK):
+        chunk = orjson.dumps(_format_forecast_rows(cols, rows[start:start + FORECAST_STREAM_CHUNK]), option=options)
+        yield (b',' if start else b'') + chunk[1:-1]
+    yield b'],"model_metrics":' + orjson.dumps(metrics, option=options) + b'}'
+
+
+def _forecast_payload(pulau_norm: Optional[str], product_norm: Optional[str]):
+    """Columns, row positions and formatted metrics for /api/forecast (product-only fallback included)"""
+    cols = data_store["forecasts_cols"]
+    rows = _forecast_rows(cols, pulau_norm, product_norm, widen=True)
+    metrics = [
+        {
+            'pulau': m.get('pulau'),
+            'product_category': m.get('product_category'),
+            'mae': m.get('mae'),
+            'mape': m.get('mape'),
+            'sample_size': m.get('sample_size'),
+        }
+        for m in _select_records("model_metrics", pulau_norm, product_norm, widen=True)
+    ]
+    return cols, rows, metrics
+
+
+@lru_cache(maxsize=64)
+def _forecast_body(version: int, pulau_norm: Optional[str], product_norm: Optional[str]) -> Optional[bytes]:
+    """Rendered /api/forecast body cached per data version; None for responses large enough to stream"""
+    cols, rows, metrics = _forecast_payload(pulau_norm, product_norm)
+    if len(rows) > FORECAST_STREAM_CHUNK:
+        return None
+    return b"".join(_forecast_json_chunks(cols, rows, metrics))
+
+
+def _stockout_flags(cols: Dict[str, Any]) -> np.ndarray:
+    """Flag forecast series whose last predicted week drops below the previous one"""
+    codes = cols["series_codes"]
+    flags = np.zeros(int(codes.max()) + 1 if len(codes) else 0, dtype=bool)
+    order = cols["order"]
+    rows = order[cols["is_forecast"][order]]
+    if not len(rows):
+        return flags
+    series = codes[rows]
+    by_series = np.argsort(series, kind='stable')
+    series = series[by_series]
+    predicted = cols["predicted"][rows][by_series]
+    predicted = np.where(np.isnan(predicted), 0.0, predicted)
+
+    last = np.flatnonzero(np.append(series[1:] != series[:-1], True))
+    last = last[(last > 0) & (series[last - 1] == series[last])]
+    flags[series[last]] = predicted[last] < predicted[last - 1]
+    return flags
+
+
+def _build_summary_tables() -> Dict[str, Any]:
+    """Pre-aggregate the stored frames per series / per pulau for the dashboard summary"""
+    forecasts = data_store["forecasts_df"]
+    rules = data_store["mba_rules_df"]
+    metrics = data_store["model_metrics_df"]
+    tables: Dict[str, Any] = {"series": None, "errors": None, "opportunities": None, "metrics": None}
+
+    if forecasts is not None and not forecasts.empty:
+        keys = ['product_category', 'pulau']
+        series = forecasts.drop_duplicates(keys)[keys + ['_pulau_key']].reset_index(drop=True)
+        series['stockout'] = _stockout_flags(data_store["forecasts_cols"])
+        tables["series"] = series
+
+        historical = forecasts[~forecasts['is_forecast'].astype(bool)]
+        actual = historical['actual']
+        predicted = historical['predicted']
+        valid = (actual > 0) & predicted.notna() & (predicted != 0)
+        errs = ((actual - predicted).abs() / actual)[valid]
+        tables["errors"] = errs.groupby(historical['_pulau_key'][valid]).agg(['sum', 'count'])
+
+    if rules is not None and not rules.empty:
+        tables["opportunities"] = rules[rules['lift'] >= 1.0].groupby('_pulau_key').size()
+
+    if metrics is not None and not metrics.empty:
+        tables["metrics"] = metrics.groupby('_pulau_key')['mape'].agg(['size', 'sum', 'count'])
+    return tables
+
+
+def _pulau_total(table, pulau_norm: Optional[str]):
+    """Total a per-pulau summary table, or one island's row (None if absent)"""
+    if table is None:
+        return None
+    if pulau_norm is None:
+        return table.sum()
+    return table.loc[pulau_norm] if pulau_norm in table.index else None
+
+
+@lru_cache(maxsize=64)
+def _dashboard_summary(version: int, pulau: Optional[str]) -> Dict[str, Any]:
+    """Dashboard summary values from the pre-aggregated tables, cached per data version"""
+    tables = data_store["summary_tables"] or {}
+    pulau_norm = _norm(pulau) if pulau else None
+
+    series = tables.get("series")
+    if series is not None and pulau_norm is not None:
+        series = series[series['_pulau_key'] == pulau_norm]
+
+    if series is None or series.empty:
+        total_products = 0
+        total_islands = 0
+        stockout_risks = 0
+    else:
+        total_products = int(series['product_category'].nunique(dropna=False))
+        total_islands = 1 if pulau else int(series['pulau'].nunique(dropna=False))
+        stockout_risks = int(series['stockout'].sum())
+
+    opportunities = _pulau_total(tables.get("opportunities"), pulau_norm)
+    bundling_opportunities = 0 if opportunities is None else int(opportunities)
+
+    metrics = _pulau_total(tables.get("metrics"), pulau_norm)
+    errors = _pulau_total(tables.get("errors"), pulau_norm)
+    if metrics is not None and metrics['size'] > 0:
+        accuracy = float(metrics['sum'] / metrics['count']) if metrics['count'] else 0.0
+    elif series is not None and not series.empty and errors is not None and errors['count']:
+        accuracy = float(errors['sum'] / errors['count'] * 100.0)
+    else:
+        accuracy = 0.0
+
+    return {
+        'total_products': total_products,
+        'total_islands': total_islands,
+        'stockout_risks': stockout_risks,
+        'opportunities': bundling_opportunities,
+        'forecast_accuracy': round(accuracy, 1)
+    }
 
 
 # Upload & Processing Endpoints
@@ -97,97 +489,134 @@ async def upload_data(file: UploadFile = File(...)):
     
     Data stored in-memory for session duration.
     """
-    try:
-        # Read uploaded file
-        content = await file.read()
-        
+    async with _upload_lock:
         try:
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(BytesIO(content))
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(BytesIO(content))
-            else:
+            # Read uploaded file straight from its spooled temp file (in memory,
+            # rolled to disk past 1 MB) instead of copying the body into a BytesIO
+            await file.seek(0)
+            
+            try:
+                if file.filename.endswith('.csv'):
+                    df = _read_upload(pd.read_csv, file.file, 'pyarrow')
+                elif file.filename.endswith(('.xlsx', '.xls')):
+                    df = _read_upload(pd.read_excel, file.file)
+                else:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail="File must be CSV (.csv) or Excel (.xlsx, .xls)"
+                    )
+            except HTTPException:
+                raise
+            except Exception as e:
                 raise HTTPException(
                     status_code=400, 
-                    detail="File must be CSV (.csv) or Excel (.xlsx, .xls)"
+                    detail=f"Error reading file: {str(e)}"
+                )
+            
+            # Validate columns
+            validate_dataframe(df)
+            
+            # Services only replace whole columns (InvoiceDate parsing), so no copy is needed
+            data_store["transactions"] = df
+            data_store["forecasts"] = []
+            data_store["mba_rules"] = []
+            data_store["recommendations"] = []
+            data_store["model_metrics"] = []
+            data_store["forecasts_df"] = None
+            data_store["mba_rules_df"] = None
+            data_store["model_metrics_df"] = None
+            data_store["indexes"] = {}
+            data_store["forecasts_cols"] = None
+            data_store["summary_tables"] = None
+            data_store["metadata"]["upload_timestamp"] = datetime.now().isoformat()
+            data_store["metadata"]["total_records_trained"] = 0
+            data_store["version"] += 1
+            
+            logger.info("Starting forecasting and MBA pipelines...")
+            try:
+                # Parse dates before the threads start so run_all_forecasts does not
+                # reassign InvoiceDate while run_all_mba copies the frame
+                if not pd.api.types.is_datetime64_any_dtype(df['InvoiceDate']):
+                    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+            except Exception as e:
+                logger.error("Error in forecasting pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
+
+            forecast_result, rules = await asyncio.gather(
+                asyncio.to_thread(run_all_forecasts, df),
+                asyncio.to_thread(run_all_mba, df),
+                return_exceptions=True,
+            )
+
+            try:
+                if isinstance(forecast_result, BaseException):
+                    raise forecast_result
+                forecast_records = forecast_result.get('forecast_data', []) if isinstance(forecast_result, dict) else (forecast_result or [])
+                model_metrics = forecast_result.get('model_metrics', []) if isinstance(forecast_result, dict) else []
+            except Exception as e:
+                logger.error("Error in forecasting pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
+
+            data_store["forecasts"] = list(forecast_records)
+            data_store["metadata"]["total_records_trained"] = sum(1 for f in forecast_records if not f.get('is_forecast'))
+            _index_records("forecasts")
+            logger.info("Stored %s forecast records in memory", len(forecast_records))
+
+            data_store["model_metrics"] = list(model_metrics)
+            _index_records("model_metrics")
+            logger.info("Stored %s metric entries in memory", len(model_metrics))
+            
+            try:
+                if isinstance(rules, BaseException):
+                    raise rules
+                data_store["mba_rules"] = list(rules)
+                _index_records("mba_rules")
+                _index_rules_by_lift()
+                logger.info("Stored %s MBA rules in memory", len(rules))
+            except Exception as e:
+                logger.error("Error in MBA pipeline: %s", e)
+                raise HTTPException(status_code=500, detail=f"MBA pipeline failed: {str(e)}")
+            
+            # The forecast frame doubles as the recommendation input, so it is built once
+            data_store["forecasts_df"] = _records_frame(data_store["forecasts"])
+            
+            # Generate recommendations
+            logger.info("Generating recommendations...")
+            try:
+                recommendations = await asyncio.to_thread(
+                    generate_recommendations, df, forecast_records, rules, data_store["forecasts_df"]
                 )
+                data_store["recommendations"] = list(recommendations)
+                _index_records("recommendations")
+                _index_recommendations()
+                logger.info("Stored %s recommendations in memory", len(recommendations))
+            except Exception as e:
+                logger.error("Error generating recommendations: %s", e)
+                raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
+            
+            data_store["mba_rules_df"] = _records_frame(data_store["mba_rules"])
+            data_store["model_metrics_df"] = _records_frame(data_store["model_metrics"])
+            data_store["forecasts_cols"] = _forecast_columns(data_store["forecasts_df"])
+            data_store["summary_tables"] = _build_summary_tables()
+
+            data_store["metadata"]["last_updated"] = datetime.now().isoformat()
+            data_store["version"] += 1
+            logger.info("Data processing completed successfully")
+            
+            return UploadResponse(
+                status="success",
+                message="Data processed successfully",
+                records=len(df)
+            )
+        
         except HTTPException:
             raise
         except Exception as e:
+            logger.exception("Unexpected error in upload_data: %s", e)
             raise HTTPException(
-                status_code=400, 
-                detail=f"Error reading file: {str(e)}"
+                status_code=500, 
+                detail=f"Processing failed: {str(e)} - Check backend logs for details"
             )
-        
-        # Validate columns
-        validate_dataframe(df)
-        
-        # Clear existing in-memory data
-        data_store["transactions"] = df.copy()
-        data_store["forecasts"] = []
-        data_store["mba_rules"] = []
-        data_store["recommendations"] = []
-        data_store["model_metrics"] = []
-        data_store["metadata"]["upload_timestamp"] = datetime.now().isoformat()
-        
-        print("Starting forecasting pipeline...")
-        try:
-            forecast_result = run_all_forecasts(df)
-            forecast_records = forecast_result.get('forecast_data', []) if isinstance(forecast_result, dict) else (forecast_result or [])
-            model_metrics = forecast_result.get('model_metrics', []) if isinstance(forecast_result, dict) else []
-        except Exception as e:
-            print(f"Error in forecasting pipeline: {e}")
-            raise HTTPException(status_code=500, detail=f"Forecasting pipeline failed: {str(e)}")
-
-        for f in forecast_records:
-            data_store["forecasts"].append(f)
-        print(f"Stored {len(forecast_records)} forecast records in memory")
-
-        for m in model_metrics:
-            data_store["model_metrics"].append(m)
-        print(f"Stored {len(model_metrics)} metric entries in memory")
-        
-        print("Starting MBA pipeline...")
-        try:
-            rules = run_all_mba(df)
-            for r in rules:
-                data_store["mba_rules"].append(r)
-            print(f"Stored {len(rules)} MBA rules in memory")
-        except Exception as e:
-            print(f"Error in MBA pipeline: {e}")
-            raise HTTPException(status_code=500, detail=f"MBA pipeline failed: {str(e)}")
-        
-        # Generate recommendations
-        print("Generating recommendations...")
-        try:
-            recommendations = generate_recommendations(df, forecast_records, rules)
-            for rec in recommendations:
-                data_store["recommendations"].append(rec)
-            print(f"Stored {len(recommendations)} recommendations in memory")
-        except Exception as e:
-            print(f"Error generating recommendations: {e}")
-            raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
-        
-        data_store["metadata"]["last_updated"] = datetime.now().isoformat()
-        print("Data processing completed successfully")
-        
-        return UploadResponse(
-            status="success",
-            message="Data processed successfully",
-            records=len(df)
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Unexpected error in upload_data: {str(e)}")
-        print(f"Traceback: {error_trace}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Processing failed: {str(e)} - Check backend logs for details"
-        )
 
 
 # User Endpoints
@@ -213,86 +642,17 @@ async def get_dashboard_summary(
     pulau: Optional[str] = Query(None, description="Filter by island name for per-region summary")
 ):
     """Get dashboard summary metrics."""
-    forecasts = data_store["forecasts"]
-    recommendations = data_store["recommendations"]
-    rules = data_store["mba_rules"]
-    metrics = data_store["model_metrics"]
-
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecasts = [f for f in forecasts if (str(f.get('pulau', '')).strip().lower() == pulau_norm)]
-        recommendations = [r for r in recommendations if (str(r.get('pulau', '')).strip().lower() == pulau_norm)]
-        rules = [r for r in rules if (str(r.get('pulau', '')).strip().lower() == pulau_norm)]
-        metrics = [m for m in metrics if (str(m.get('pulau', '')).strip().lower() == pulau_norm)]
-
-    total_products = len({f.get('product_category') for f in forecasts}) if forecasts else 0
-    
-    if pulau:
-        total_islands = 1 if forecasts else 0
-    else:
-        total_islands = len({f.get('pulau') for f in forecasts}) if forecasts else 0
-
-    stockout_risks = 0
-    if forecasts:
-        from collections import defaultdict
-        series = defaultdict(list)
-        for f in forecasts:
-            if f.get('is_forecast'):
-                series[(f.get('product_category'), f.get('pulau'))].append(f)
-        for (_, _), rows in series.items():
-            rows.sort(key=lambda r: r.get('week') or '')
-            if len(rows) >= 2:
-                cur = rows[-2]
-                nxt = rows[-1]
-                if (nxt.get('predicted') or 0) < (cur.get('predicted') or 0):
-                    stockout_risks += 1
-
-    bundling_opportunities = len([r for r in rules if r.get('lift') is not None and r.get('lift', 0) >= 1.0])
-
-    if metrics:
-        mape_vals = [m.get('mape') for m in metrics if m.get('mape') is not None]
-        accuracy = (sum(mape_vals) / len(mape_vals)) if mape_vals else 0.0
-    else:
-        historical = [f for f in forecasts if not f.get('is_forecast')]
-        if historical:
-            errs = []
-            for h in historical:
-                actual = h.get('actual')
-                predicted = h.get('predicted')
-                if actual and actual > 0 and predicted:
-                    errs.append(abs(actual - predicted) / actual)
-            accuracy = (sum(errs) / len(errs) * 100.0) if errs else 0.0
-        else:
-            accuracy = 0.0
-
-    return DashboardSummary(
-        total_products=total_products,
-        total_islands=total_islands,
-        stockout_risks=stockout_risks,
-        opportunities=bundling_opportunities,
-        forecast_accuracy=round(accuracy, 1)
-    )
+    return ORJSONResponse(_dashboard_summary(data_store["version"], pulau))
 
 
 @app.get("/api/training-metadata")
 async def get_training_metadata():
     """Get model training metadata."""
-    try:
-        forecasts = data_store["forecasts"]
-        total_trained = len([f for f in forecasts if not f.get('is_forecast')])
-        
-        return {
-            "last_trained": data_store["metadata"].get("last_updated") or datetime.now().isoformat(),
-            "total_records_trained": total_trained,
-            "model_version": "LightGBM v4.0.0"
-        }
-    except Exception as e:
-        print(f"Error in get_training_metadata: {e}")
-        return {
-            "last_trained": datetime.now().isoformat(),
-            "total_records_trained": 0,
-            "model_version": "LightGBM v4.0.0"
-        }
+    return {
+        "last_trained": data_store["metadata"].get("last_updated") or datetime.now().isoformat(),
+        "total_records_trained": data_store["metadata"]["total_records_trained"],
+        "model_version": "LightGBM v4.0.0"
+    }
 
 
 # Forecast Endpoints
@@ -303,67 +663,14 @@ async def get_forecast(
     product: Optional[str] = Query(None, description="Filter by product category")
 ):
     """Get forecast data for charting."""
-    forecasts = data_store["forecasts"]
-    metrics = data_store["model_metrics"]
-
-    forecast_list = forecasts
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecast_list = [f for f in forecast_list if str(f.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        forecast_list = [f for f in forecast_list if product_norm in str(f.get('product_category', '')).strip().lower()]
-    
-    forecast_list = sorted(forecast_list, key=lambda f: f.get('week', ''))
-
-    if product and not forecast_list:
-        product_norm = product.strip().lower()
-        forecast_list = [f for f in data_store["forecasts"] if product_norm in str(f.get('product_category', '')).strip().lower()]
-        forecast_list = sorted(forecast_list, key=lambda f: f.get('week', ''))
-
-    formatted_forecasts = [
-        {
-            'week': f.get('week'),
-            'actual': f.get('actual'),
-            'predicted': f.get('predicted'),
-            'is_forecast': bool(f.get('is_forecast')),
-            'pulau': f.get('pulau'),
-            'product_category': f.get('product_category'),
-        }
-        for f in forecast_list
-    ]
-
-    metrics_list = metrics
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        metrics_list = [m for m in metrics_list if str(m.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        metrics_list = [m for m in metrics_list if product_norm in str(m.get('product_category', '')).strip().lower()]
+    pulau_norm = _norm(pulau)
+    product_norm = _norm(product)
+    body = _forecast_body(data_store["version"], pulau_norm, product_norm)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
 
-    if product and not metrics_list:
-        product_norm = product.strip().lower()
-        metrics_list = [m for m in data_store["model_metrics"] if product_norm in str(m.get('product_category', '')).strip().lower()]
-
-    formatted_metrics = [
-        {
-            'pulau': m.get('pulau'),
-            'product_category': m.get('product_category'),
-            'mae': m.get('mae'),
-            'mape': m.get('mape'),
-            'sample_size': m.get('sample_size'),
-        }
-        for m in metrics_list
-    ]
-
-    return {
-        'forecast_data': formatted_forecasts,
-        'model_metrics': formatted_metrics,
-    }
+    cols, rows, metrics = _forecast_payload(pulau_norm, product_norm)
+    return StreamingResponse(_forecast_json_chunks(cols, rows, metrics), media_type="application/json")
 
 
 @app.get("/api/forecast/metrics")
@@ -372,18 +679,12 @@ async def get_forecast_metrics(
     product: Optional[str] = Query(None, description="Filter by product category")
 ):
     """Get model metrics for forecast accuracy evaluation."""
-    metrics = data_store["model_metrics"]
-
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        metrics = [m for m in metrics if str(m.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        metrics = [m for m in metrics if product_norm in str(m.get('product_category', '')).strip().lower()]
+    pulau_norm = _norm(pulau)
+    product_norm = _norm(product)
+    metrics = _select_records("model_metrics", pulau_norm, product_norm, widen=True)
 
     if metrics:
-        return [
+        return ORJSONResponse([
             {
                 'pulau': m.get('pulau'),
                 'product_category': m.get('product_category'),
@@ -392,67 +693,46 @@ async def get_forecast_metrics(
                 'sample_size': m.get('sample_size'),
             }
             for m in sorted(metrics, key=lambda m: (m.get('pulau', ''), m.get('product_category', '')))
-        ]
-
-    if product:
-        product_norm = product.strip().lower()
-        alt_metrics = [m for m in data_store["model_metrics"] if product_norm in str(m.get('product_category', '')).strip().lower()]
-        if alt_metrics:
-            return [
-                {
-                    'pulau': m.get('pulau'),
-                    'product_category': m.get('product_category'),
-                    'mae': m.get('mae'),
-                    'mape': m.get('mape'),
-                    'sample_size': m.get('sample_size'),
-                }
-                for m in sorted(alt_metrics, key=lambda m: (m.get('pulau', ''), m.get('product_category', '')))
-            ]
-
-    historical = [f for f in data_store["forecasts"] if not f.get('is_forecast')]
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        historical = [f for f in historical if str(f.get('pulau', '')).strip().lower() == pulau_norm]
-    
-    if product:
-        product_norm = product.strip().lower()
-        historical = [f for f in historical if product_norm in str(f.get('product_category', '')).strip().lower()]
+        ])
 
-    if not historical:
+    forecasts = data_store["forecasts_df"]
+    if forecasts is None:
         return []
 
-    agg = {}
-    for h in historical:
-        key = (h.get('pulau'), h.get('product_category'))
-        if key not in agg:
-            agg[key] = {
-                'errors': [],
-                'mape_vals': [],
-                'count': 0,
-            }
-        actual = h.get('actual')
-        predicted = h.get('predicted')
-        if actual is not None and predicted is not None:
-            err = abs((actual or 0) - (predicted or 0))
-            agg[key]['errors'].append(err)
-            if actual and actual != 0:
-                agg[key]['mape_vals'].append(abs((actual - predicted) / actual) * 100)
-        agg[key]['count'] += 1
-
-    results = []
-    for (pul, prod), v in agg.items():
-        mae = float(sum(v['errors']) / len(v['errors'])) if v['errors'] else 0.0
-        mape = float(sum(v['mape_vals']) / len(v['mape_vals'])) if v['mape_vals'] else 0.0
-        results.append({
+    historical = forecasts[~forecasts['is_forecast'].astype(bool)]
+    if pulau_norm is not None:
+        historical = historical[historical['_pulau_key'] == pulau_norm]
+    if product_norm is not None:
+        historical = historical[historical['_prod_key'].str.contains(product_norm, regex=False)]
+
+    if historical.empty:
+        return []
+
+    actual = historical['actual']
+    predicted = historical['predicted']
+    err = (actual - predicted).abs().where(actual.notna() & predicted.notna())
+    scored = pd.DataFrame({
+        'pulau': historical['pulau'],
+        'product_category': historical['product_category'],
+        'err': err,
+        'ape': (err / actual.where(actual != 0)).abs() * 100,
+    })
+    agg = (
+        scored.groupby(['pulau', 'product_category'], sort=False, dropna=False)
+        .agg(mae=('err', 'mean'), mape=('ape', 'mean'), sample_size=('err', 'size'))
+        .fillna(0.0)
+    )
+
+    return ORJSONResponse([
+        {
             'pulau': pul,
             'product_category': prod,
-            'mae': round(mae, 2),
-            'mape': round(mape, 2),
-            'sample_size': v['count'],
-        })
-
-    return results
+            'mae': round(float(mae), 2),
+            'mape': round(float(mape), 2),
+            'sample_size': int(count),
+        }
+        for (pul, prod), mae, mape, count in zip(agg.index, agg['mae'], agg['mape'], agg['sample_size'])
+    ])
 
 
 # MBA Endpoints
@@ -464,24 +744,18 @@ async def get_mba_rules(
     limit: int = Query(50, description="Maximum number of rules to return")
 ):
     """Get Market Basket Analysis rules."""
-    rules = data_store["mba_rules"]
-    
-    if pulau:
-        rules = [r for r in rules if str(r.get('pulau', '')).strip() == pulau.strip()]
-    
-    rules = [r for r in rules if r.get('lift', 0) >= min_lift]
-    rules = sorted(rules, key=lambda r: r.get('lift', 0), reverse=True)[:limit]
+    rules = _select_rules(_strip(pulau), min_lift, limit)
     
-    return [
-        MBARuleResponse(
-            antecedents=r.get('antecedents', ''),
-            consequents=r.get('consequents', ''),
-            support=r.get('support', 0.0),
-            confidence=r.get('confidence', 0.0),
-            lift=r.get('lift', 0.0)
-        ) 
+    return ORJSONResponse([
+        {
+            'antecedents': r.get('antecedents', ''),
+            'consequents': r.get('consequents', ''),
+            'support': float(r.get('support', 0.0)),
+            'confidence': float(r.get('confidence', 0.0)),
+            'lift': float(r.get('lift', 0.0)),
+        }
         for r in rules
-    ]
+    ])
 
 
 # Recommendation Endpoints
@@ -493,26 +767,20 @@ async def get_recommendations(
     priority: Optional[str] = Query(None, description="Filter by priority: high, medium, low")
 ):
     """Get DSS recommendations."""
-    recs = data_store["recommendations"]
+    recs = _select_recommendations(_strip(pulau), type, priority)
     
-    if pulau:
-        recs = [r for r in recs if str(r.get('pulau', '')).strip() == pulau.strip()]
-    if type:
-        recs = [r for r in recs if str(r.get('type', '')).strip() == type.strip()]
-    if priority:
-        recs = [r for r in recs if str(r.get('priority', '')).strip() == priority.strip()]
-    
-    return [
-        RecommendationResponse(
-            type=r.get('type', ''),
-            product=r.get('product', ''),
-            related_product=r.get('related_product'),
-            action=r.get('action', ''),
-            priority=r.get('priority', 'medium'),
-            confidence=r.get('confidence', 0.85)
-        ) 
-        for r in recs
-    ]
+    rows = []
+    for r in recs:
+        conf = r.get('confidence', 0.85)
+        rows.append({
+            'type': r.get('type', ''),
+            'product': r.get('product', ''),
+            'related_product': r.get('related_product'),
+            'action': r.get('action', ''),
+            'priority': r.get('priority', 'medium'),
+            'confidence': None if conf is None else float(conf),
+        })
+    return ORJSONResponse(rows)
 
 
 # Utility Endpoints
@@ -520,21 +788,13 @@ async def get_recommendations(
 @app.get("/api/islands", response_model=List[str])
 async def get_islands():
     """Get list of available islands/regions."""
-    forecasts = data_store["forecasts"]
-    islands = list(set(f.get('pulau') for f in forecasts if f.get('pulau')))
-    return sorted([i for i in islands if i])
+    return list(_island_names(data_store["version"]))
 
 
 @app.get("/api/products", response_model=List[str])
 async def get_products(pulau: Optional[str] = Query(None)):
     """Get list of available product categories."""
-    forecasts = data_store["forecasts"]
-    
-    if pulau:
-        forecasts = [f for f in forecasts if f.get('pulau') == pulau]
-    
-    products = list(set(f.get('product_category') for f in forecasts if f.get('product_category')))
-    return sorted([p for p in products if p])
+    return list(_product_names(data_store["version"], pulau or None))
 
 
 @app.get("/")
@@ -552,11 +812,7 @@ async def health_check():
 @app.get("/api/debug/products")
 async def debug_products(pulau: Optional[str] = Query(None)):
     """Get distinct product categories for debugging."""
-    forecasts = data_store["forecasts"]
-    
-    if pulau:
-        pulau_norm = pulau.strip().lower()
-        forecasts = [f for f in forecasts if str(f.get('pulau', '')).strip().lower() == pulau_norm]
+    forecasts = _select_records("forecasts", _norm(pulau))
     
     products = list(set(f.get('product_category') for f in forecasts if f.get('product_category')))
     return [p for p in products if p]
@@ -1,26 +1,42 @@
 """Market Basket Analysis using FP-Growth algorithm with memory optimization"""
 
+import logging
+import numpy as np
 import pandas as pd
 import warnings
+from scipy import sparse
 from typing import List, Dict, Any
 
 from mlxtend.frequent_patterns import fpgrowth, association_rules
 
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 
 def clean_data_for_mba(df: pd.DataFrame) -> pd.DataFrame:
     """Clean transaction data for MBA processing"""
-    df_clean = df.copy()
-    
-    df_clean.dropna(axis=0, subset=['InvoiceNo'], inplace=True)
-    df_clean['InvoiceNo'] = df_clean['InvoiceNo'].astype(str)
-    
-    df_clean = df_clean[df_clean['Quantity'] > 0]
-    
-    df_clean['PRODUCT_CATEGORY'] = df_clean['PRODUCT_CATEGORY'].astype(str).str.strip()
+    # One mask drops missing invoices and returns
+    filtered = df.loc[df['InvoiceNo'].notna() & (df['Quantity'] > 0)]
     
-    return df_clean
+    # assign() writes the cleaned columns into a new frame, leaving df untouched
+    # without a full df.copy() first
+    return filtered.assign(
+        InvoiceNo=filtered['InvoiceNo'].astype(str),
+        PRODUCT_CATEGORY=filtered['PRODUCT_CATEGORY'].astype(str).str.strip(),
+    )
+
+def _basket_sets(invoices: np.ndarray, cat_codes: np.ndarray, categories: pd.Index) -> pd.DataFrame:
+    """Sparse boolean InvoiceNo x category presence matrix from per-row invoices and sorted category codes"""
+    # Quantity <= 0 rows were dropped in clean_data_for_mba, so presence == (summed Quantity > 0)
+    inv_codes, invoice_labels = pd.factorize(invoices, sort=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(inv_codes), dtype=bool), (inv_codes, cat_codes)),
+        shape=(len(invoice_labels), len(categories)),
+    )
+    matrix.sum_duplicates()
+    return pd.DataFrame.sparse.from_spmatrix(matrix, columns=categories)
+
 
 def run_market_basket_analysis(
     df: pd.DataFrame, 
@@ -30,131 +46,135 @@ def run_market_basket_analysis(
     min_item_occurence: int = 5
 ) -> List[Dict[str, Any]]:
     """Run FP-Growth MBA for single island"""
-    print(f"\nProcessing Market Basket: {pulau}...")
+    logger.info("Processing Market Basket: %s", pulau)
     
-    island_data = df[df['PULAU'] == pulau].copy()
+    island_data = df[df['PULAU'] == pulau]
     
     if island_data.empty:
-        print("   -> No data found.")
+        logger.info("%s: no data found", pulau)
         return []
 
-    item_counts = island_data['PRODUCT_CATEGORY'].value_counts()
-    valid_items = item_counts[item_counts >= min_item_occurence].index
-    island_data = island_data[island_data['PRODUCT_CATEGORY'].isin(valid_items)]
+    cat_codes, categories = pd.factorize(island_data['PRODUCT_CATEGORY'], sort=True)
+    keep = np.bincount(cat_codes, minlength=len(categories)) >= min_item_occurence
+    rows = keep[cat_codes]
 
-    if island_data.empty:
-        print(f"   -> No data after pruning items with < {min_item_occurence} transactions.")
+    if not rows.any():
+        logger.info("%s: no data after pruning items with < %s transactions", pulau, min_item_occurence)
         return []
 
-    basket = island_data.pivot_table(
-        index='InvoiceNo', 
-        columns='PRODUCT_CATEGORY', 
-        values='Quantity', 
-        aggfunc='sum'
-    ).fillna(0)
-
-    basket_sets = basket.applymap(lambda x: True if x > 0 else False)
+    # Renumber the surviving categories 0..k-1, keeping their sorted order
+    basket_sets = _basket_sets(
+        island_data['InvoiceNo'].to_numpy()[rows],
+        (np.cumsum(keep) - 1)[cat_codes[rows]],
+        categories[keep],
+    )
 
     if 'POSTAGE' in basket_sets.columns:
         basket_sets.drop('POSTAGE', inplace=True, axis=1)
 
-    print(f"   -> Matrix shape: {basket_sets.shape}")
+    logger.debug("%s: matrix shape %s", pulau, basket_sets.shape)
 
     try:
         frequent_itemsets = fpgrowth(basket_sets, min_support=min_support, use_colnames=True)
     except MemoryError:
-        print("   Error: Memory overflow in FP-Growth. Increase min_support.")
+        logger.error("%s: memory overflow in FP-Growth. Increase min_support.", pulau)
         return []
-    except Exception as e:
-        print(f"   Error in FP-Growth: {str(e)}")
+    except Exception:
+        logger.exception("%s: error in FP-Growth", pulau)
         return []
 
     if frequent_itemsets.empty:
-        print("   -> No itemsets meet support threshold.")
+        logger.info("%s: no itemsets meet support threshold", pulau)
         return []
 
     try:
         rules_df = association_rules(frequent_itemsets, metric="lift", min_threshold=min_lift)
     except ValueError:
-        print("   -> Failed to generate rules.")
+        logger.info("%s: failed to generate rules", pulau)
         return []
 
     if rules_df.empty:
-        print("   -> No rules meet lift threshold.")
+        logger.info("%s: no rules meet lift threshold", pulau)
         return []
 
     rules_df = rules_df.sort_values(['lift', 'confidence'], ascending=[False, False])
     
-    rules_df['antecedents'] = rules_df['antecedents'].apply(lambda x: ', '.join(list(x)))
-    rules_df['consequents'] = rules_df['consequents'].apply(lambda x: ', '.join(list(x)))
+    rules_df['antecedents'] = [', '.join(x) for x in rules_df['antecedents']]
+    rules_df['consequents'] = [', '.join(x) for x in rules_df['consequents']]
 
-    rules_list = []
-    for _, row in rules_df.iterrows():
-        rules_list.append({
+    # Zip the columns instead of iterrows; Python round() is kept because
+    # DataFrame.round can differ from it in the last digit
+    rules_list = [
+        {
             'pulau': pulau,
-            'antecedents': row['antecedents'],
-            'consequents': row['consequents'],
-            'support': round(row['support'], 4),
-            'confidence': round(row['confidence'], 4),
-            'lift': round(row['lift'], 4)
-        })
-
-    print(f"   -> Found {len(rules_list)} rules.")
+            'antecedents': antecedents,
+            'consequents': consequents,
+            'support': round(support, 4),
+            'confidence': round(confidence, 4),
+            'lift': round(lift, 4)
+        }
+        for antecedents, consequents, support, confidence, lift in zip(
+            rules_df['antecedents'],
+            rules_df['consequents'],
+            rules_df['support'].tolist(),
+            rules_df['confidence'].tolist(),
+            rules_df['lift'].tolist(),
+        )
+    ]
+
+    logger.debug("%s: found %s rules", pulau, len(rules_list))
     return rules_list
 
 
 def run_all_mba(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """Run MBA for all islands with centralized data preprocessing"""
-    import traceback
-    
     try:
-        print("=== START MARKET BASKET ANALYSIS PIPELINE ===")
+        logger.info("Starting market basket analysis pipeline")
         
         try:
             df_clean = clean_data_for_mba(df)
-            print(f"Total Clean Transactions: {len(df_clean)}")
-        except Exception as e:
-            print(f"Error during data cleaning: {str(e)}")
-            print(traceback.format_exc())
+            logger.info("Total clean transactions: %s", len(df_clean))
+        except Exception:
+            logger.exception("Error during data cleaning")
             raise
         
         all_rules = []
         islands = df_clean['PULAU'].unique()
-        print(f"Processing {len(islands)} islands: {list(islands)}")
+        logger.info("Processing %s islands: %s", len(islands), list(islands))
         
         MIN_SUPPORT = 0.1
         MIN_LIFT = 2.0
         
-        for pulau in islands:
+        # One groupby pass yields every island's rows (same order as unique())
+        for pulau, island_df in df_clean.groupby('PULAU', sort=False):
             try:
-                print(f"\nProcessing island: {pulau}")
                 rules = run_market_basket_analysis(
-                    df_clean, 
+                    island_df, 
                     pulau, 
                     min_support=MIN_SUPPORT, 
                     min_lift=MIN_LIFT
                 )
-                print(f"  Generated {len(rules)} rules for {pulau}")
+                logger.info("Generated %s rules for %s", len(rules), pulau)
                 all_rules.extend(rules)
-            except Exception as e:
-                print(f"Error processing island {pulau}: {str(e)}")
-                print(traceback.format_exc())
+            except Exception:
+                logger.exception("Error processing island %s", pulau)
                 raise
         
         if all_rules:
-            df_res = pd.DataFrame(all_rules)
-            print("\n=== TOP 10 RULES (GLOBAL) ===")
-            print(df_res[['pulau', 'antecedents', 'consequents', 'confidence', 'lift']]
-                  .sort_values(by='lift', ascending=False)
-                  .head(10)
-                  .to_string(index=False))
-            print(f"\nMBA Pipeline complete: {len(all_rules)} total rules generated")
+            # The table is only rendered when someone is reading DEBUG logs
+            if logger.isEnabledFor(logging.DEBUG):
+                df_res = pd.DataFrame(all_rules)
+                logger.debug("TOP 10 RULES (GLOBAL):\n%s",
+                             df_res[['pulau', 'antecedents', 'consequents', 'confidence', 'lift']]
+                             .sort_values(by='lift', ascending=False)
+                             .head(10)
+                             .to_string(index=False))
+            logger.info("MBA Pipeline complete: %s total rules generated", len(all_rules))
         else:
-            print("\nWarning: No rules generated from any island")
+            logger.warning("No rules generated from any island")
             
         return all_rules
         
-    except Exception as e:
-        print(f"\nFATAL ERROR in run_all_mba: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception("Fatal error in run_all_mba")
         raise
\ No newline at end of file
@@ -1,10 +1,16 @@
 """Recommendation service generating DSS insights from forecast and MBA results"""
 
+import logging
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from sqlalchemy.orm import Session
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 
+logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=4096)
 def to_title_case(text: str) -> str:
     """Convert text to title case with comma handling"""
     if not text:
@@ -14,211 +20,208 @@ def to_title_case(text: str) -> str:
     return ', '.join(titled_parts)
 
 
+def _bincount_mean(codes: np.ndarray, values: pd.Series, mask: np.ndarray, n: int) -> np.ndarray:
+    """NaN-skipping mean of values per group code 0..n-1 over the masked rows; empty groups are NaN"""
+    vals = values.to_numpy(dtype=float)
+    valid = mask & (codes >= 0) & ~np.isnan(vals)
+    sums = np.bincount(codes[valid], weights=vals[valid], minlength=n)
+    counts = np.bincount(codes[valid], minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def _mean_by_key(keys: pd.Series, values: pd.Series) -> pd.Series:
+    """NaN-skipping mean of values per key (groupby().mean() semantics) via factorize + bincount"""
+    codes, uniques = pd.factorize(keys)
+    return pd.Series(_bincount_mean(codes, values, np.ones(len(codes), dtype=bool), len(uniques)), index=uniques)
+
+
 def generate_recommendations(
     df: pd.DataFrame,
     forecasts: List[Dict[str, Any]],
     rules: List[Dict[str, Any]],
-    db: Session = None
+    forecast_df: Optional[pd.DataFrame] = None
 ) -> List[Dict[str, Any]]:
-    """Generate recommendations based on forecasts and MBA rules"""
-    import traceback
-    
+    """Generate recommendations based on forecasts and MBA rules; reuses forecast_df when the caller already built it"""
     try:
-        print("=== START RECOMMENDATIONS GENERATION PIPELINE ===")
-        print(f"Input: {len(forecasts)} forecasts, {len(rules)} MBA rules")
+        logger.info("Generating recommendations from %s forecasts and %s MBA rules", len(forecasts), len(rules))
         
-        recommendations = []
+        # Keyed by (pulau, type, product, related_product); the first rule to
+        # emit a key wins, so duplicates are dropped as they are generated
+        recommendations = {}
         
-        try:
+        if forecast_df is None:
             forecast_df = pd.DataFrame(forecasts)
-            print(f"✓ Loaded {len(forecast_df)} forecast records")
-        except Exception as e:
-            print(f"❌ Error converting forecasts to DataFrame: {str(e)}")
-            print(traceback.format_exc())
-            return []
-        
         if forecast_df.empty:
-            print("⚠️ Warning: Empty forecast DataFrame")
-            return recommendations
+            logger.warning("No forecast records, skipping recommendations")
+            return []
         
         # Filter future forecasts only
-        try:
-            future_forecasts = forecast_df[forecast_df['is_forecast'] == 1]
-            print(f"✓ Filtered {len(future_forecasts)} future forecast records")
-        except Exception as e:
-            print(f"❌ Error filtering future forecasts: {str(e)}")
-            print(traceback.format_exc())
-            return recommendations
-        
+        future_forecasts = forecast_df[forecast_df['is_forecast'] == 1]
         if future_forecasts.empty:
-            print("⚠️ Warning: No future forecasts found")
-            return recommendations
+            logger.warning("No future forecasts found, skipping recommendations")
+            return []
+        
+        # Index rules once by (pulau, antecedent) and (pulau, consequent) so the
+        # product loops below look up their rules instead of rescanning them
+        rules_by_antecedent = defaultdict(list)
+        rules_by_consequent = defaultdict(list)
+        for r in rules:
+            rules_by_antecedent[(r['pulau'], r.get('antecedents'))].append(r)
+            rules_by_consequent[(r['pulau'], r.get('consequents'))].append(r)
+        rule_counts = Counter(r['pulau'] for r in rules)
         
-        islands = future_forecasts['pulau'].unique()
-        print(f"Processing {len(islands)} islands: {list(islands)}")
+        # Split future and historical rows by island in one pass each, instead of
+        # masking the full frame twice per island
+        future_by_pulau = future_forecasts.groupby('pulau', sort=False)
+        historical_by_pulau = dict(iter(forecast_df[forecast_df['is_forecast'] == 0].groupby('pulau', sort=False)))
+        logger.debug("Processing %s islands", future_by_pulau.ngroups)
         
-        for pulau in islands:
+        for pulau, pulau_forecasts in future_by_pulau:
             try:
-                print(f"\n  Processing pulau: {pulau}")
-                pulau_forecasts = future_forecasts[future_forecasts['pulau'] == pulau]
-                pulau_rules = [r for r in rules if r['pulau'] == pulau]
-                print(f"    - {len(pulau_forecasts)} future forecasts, {len(pulau_rules)} rules")
+                logger.debug("%s: %s future forecasts, %s rules", pulau, len(pulau_forecasts), rule_counts[pulau])
+                if not rule_counts[pulau]:
+                    # Both recommendation types need an MBA rule for this island
+                    continue
+                
+                island_start = len(recommendations)
                 
                 # Calculate average forecast per product
-                try:
-                    product_forecasts = pulau_forecasts.groupby('product_category')['predicted'].mean()
-                    print(f"    - {len(product_forecasts)} unique products")
-                except Exception as e:
-                    print(f"    ❌ Error grouping forecasts: {str(e)}")
-                    print(traceback.format_exc())
-                    continue
+                product_forecasts = pulau_forecasts.groupby('product_category')['predicted'].mean()
                 
                 # Get historical average for comparison
-                historical = forecast_df[
-                    (forecast_df['pulau'] == pulau) & 
-                    (forecast_df['is_forecast'] == 0)
-                ]
+                historical = historical_by_pulau.get(pulau)
                 
-                if not historical.empty:
-                    historical_avg = historical.groupby('product_category')['actual'].mean()
+                if historical is not None:
+                    historical_avg = _mean_by_key(historical['product_category'], historical['actual'])
                 else:
                     historical_avg = product_forecasts * 0.9
                 
                 # === DERIVED DEMAND RECOMMENDATIONS ===
-                # Products with increasing forecast
-                for product in product_forecasts.index:
-                    try:
-                        forecast_val = product_forecasts.get(product, 0)
-                        hist_val = historical_avg.get(product, forecast_val)
-                        
-                        if hist_val > 0:
-                            growth_rate = (forecast_val - hist_val) / hist_val
-                        else:
-                            growth_rate = 0
-                        
-                        # If forecast is UP (growth > 10%), check MBA for related products
-                        if growth_rate > 0.1:
-                            for rule in pulau_rules:
-                                if rule.get('antecedents') == product and rule.get('lift', 0) > 1.5:
-                                    priority = 'high' if rule['lift'] > 2.0 else 'medium'
-                                    # Calculate confidence from lift (normalized to 0-1)
-                                    confidence = min(1.0, (rule['lift'] - 1.0) / 3.0 + 0.5)  # lift 1.0->0.5, lift 3.0->0.67, lift 5.0->1.0
-                                    recommendations.append({
-                                        'pulau': pulau,
-                                        'type': 'derived_demand',
-                                        'product': product,
-                                        'related_product': rule['consequents'],
-                                        'action': f"Tambah stok {to_title_case(rule['consequents'])} - "
-                                                 f"sering dibeli bersama {to_title_case(product)} "
-                                                 f"(lift: {rule['lift']:.2f})",
-                                        'priority': priority,
-                                        'confidence': confidence
-                                    })
-                    except Exception as e:
-                        print(f"    ⚠️ Error processing product {product}: {str(e)}")
-                        continue
+                # Products with increasing forecast (growth > 10%), computed for all
+                # products at once. Missing or NaN history falls back to the forecast
+                # itself, and non-positive history counts as no growth.
+                forecast_vals = product_forecasts.to_numpy(dtype=float)
+                hist_vals = historical_avg.reindex(product_forecasts.index).fillna(product_forecasts).to_numpy(dtype=float)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    growth = np.where(hist_vals > 0, (forecast_vals - hist_vals) / hist_vals, 0.0)
+                grow_products = product_forecasts.index[growth > 0.1]
+                
+                # Check MBA for related products of the growing ones only
+                for product in grow_products:
+                    for rule in rules_by_antecedent.get((pulau, product), ()):
+                        if rule.get('lift', 0) > 1.5:
+                            key = (pulau, 'derived_demand', product, rule['consequents'])
+                            if key in recommendations:
+                                continue
+                            priority = 'high' if rule['lift'] > 2.0 else 'medium'
+                            # Calculate confidence from lift (normalized to 0-1)
+                            confidence = min(1.0, (rule['lift'] - 1.0) / 3.0 + 0.5)  # lift 1.0->0.5, lift 3.0->0.67, lift 5.0->1.0
+                            recommendations[key] = {
+                                'pulau': pulau,
+                                'type': 'derived_demand',
+                                'product': product,
+                                'related_product': rule['consequents'],
+                                'action': f"Tambah stok {to_title_case(rule['consequents'])} - "
+                                         f"sering dibeli bersama {to_title_case(product)} "
+                                         f"(lift: {rule['lift']:.2f})",
+                                'priority': priority,
+                                'confidence': confidence
+                            }
                 
                 # === DEAD STOCK RECOMMENDATIONS ===
                 # Products with low/declining forecast
                 low_forecast_products = product_forecasts.nsmallest(5).index
+                median_forecast = product_forecasts.median()
+                # Plain dicts for the scalar lookups below; Series.get goes through label indexing
+                forecast_by_product = product_forecasts.to_dict()
+                hist_by_product = historical_avg.to_dict()
                 
                 for product in low_forecast_products:
-                    try:
-                        forecast_val = product_forecasts.get(product, 0)
-                        hist_val = historical_avg.get(product, forecast_val)
-                        
-                        if hist_val > 0:
-                            decline_rate = (hist_val - forecast_val) / hist_val
-                        else:
-                            decline_rate = 0
-                        
-                        # If forecast is LOW or declining, suggest bundling
-                        if forecast_val < product_forecasts.median() or decline_rate > 0.1:
-                            for rule in pulau_rules:
-                                if rule.get('consequents') == product and rule.get('confidence', 0) > 0.3:
-                                    anchor = rule['antecedents']
-                                    anchor_forecast = product_forecasts.get(anchor, 0)
-                                    
-                                    # Only suggest if anchor has good forecast
-                                    if anchor_forecast > product_forecasts.median():
-                                        # Use rule confidence directly if available
-                                        confidence = rule.get('confidence', 0.75)
-                                        recommendations.append({
-                                            'pulau': pulau,
-                                            'type': 'dead_stock',
-                                            'product': product,
-                                            'related_product': anchor,
-                                            'action': f"Bundle {to_title_case(product)} dengan {to_title_case(anchor)} untuk penawaran - "
-                                                     f"kepercayaan: {confidence:.0%}",
-                                            'priority': 'medium' if decline_rate > 0.2 else 'low',
-                                            'confidence': confidence
-                                        })
-                    except Exception as e:
-                        print(f"    ⚠️ Error processing dead stock for {product}: {str(e)}")
-                        continue
-                
-                print(f"    ✓ Generated {len([r for r in recommendations if r['pulau'] == pulau])} recommendations for {pulau}")
+                    forecast_val = forecast_by_product.get(product, 0)
+                    hist_val = hist_by_product.get(product, forecast_val)
+                    
+                    if hist_val > 0:
+                        decline_rate = (hist_val - forecast_val) / hist_val
+                    else:
+                        decline_rate = 0
+                    
+                    # If forecast is LOW or declining, suggest bundling
+                    if forecast_val < median_forecast or decline_rate > 0.1:
+                        for rule in rules_by_consequent.get((pulau, product), ()):
+                            if rule.get('confidence', 0) > 0.3:
+                                anchor = rule['antecedents']
+                                key = (pulau, 'dead_stock', product, anchor)
+                                if key in recommendations:
+                                    continue
+                                anchor_forecast = forecast_by_product.get(anchor, 0)
+                                
+                                # Only suggest if anchor has good forecast
+                                if anchor_forecast > median_forecast:
+                                    # Use rule confidence directly if available
+                                    confidence = rule.get('confidence', 0.75)
+                                    recommendations[key] = {
+                                        'pulau': pulau,
+                                        'type': 'dead_stock',
+                                        'product': product,
+                                        'related_product': anchor,
+                                        'action': f"Bundle {to_title_case(product)} dengan {to_title_case(anchor)} untuk penawaran - "
+                                                 f"kepercayaan: {confidence:.0%}",
+                                        'priority': 'medium' if decline_rate > 0.2 else 'low',
+                                        'confidence': confidence
+                                    }
+            
+                logger.debug("%s: %s recommendations", pulau, len(recommendations) - island_start)
                 
-            except Exception as e:
-                print(f"  ❌ Error processing island {pulau}: {str(e)}")
-                print(traceback.format_exc())
+            except Exception:
+                logger.exception("Error generating recommendations for island %s", pulau)
                 continue
         
-        # Remove duplicates based on product + related_product
-        try:
-            seen = set()
-            unique_recommendations = []
-            for rec in recommendations:
-                key = (rec['pulau'], rec['type'], rec['product'], rec.get('related_product'))
-                if key not in seen:
-                    seen.add(key)
-                    unique_recommendations.append(rec)
-            
-            print(f"\n✓ Recommendations Generation complete: {len(unique_recommendations)} unique recommendations")
-            return unique_recommendations
-        except Exception as e:
-            print(f"❌ Error removing duplicates: {str(e)}")
-            print(traceback.format_exc())
-            return recommendations
+        logger.info("Generated %s unique recommendations", len(recommendations))
+        return list(recommendations.values())
             
-    except Exception as e:
-        print(f"\n❌ FATAL ERROR in generate_recommendations: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception("Fatal error in generate_recommendations")
         return []
 
-def get_stockout_risks(forecasts: List[Dict[str, Any]], threshold: float = 0.8) -> int:
+def get_stockout_risks(
+    forecasts: List[Dict[str, Any]],
+    threshold: float = 0.8,
+    forecast_df: Optional[pd.DataFrame] = None
+) -> int:
     """
     Hitung jumlah produk dengan risiko stockout tinggi.
     
     Args:
         forecasts: List hasil forecasting
         threshold: Threshold untuk menentukan risiko tinggi
+        forecast_df: DataFrame dari forecasts yang sudah dibangun pemanggil (opsional)
     
     Returns:
         Jumlah produk dengan risiko stockout
     """
-    forecast_df = pd.DataFrame(forecasts)
+    if forecast_df is None:
+        forecast_df = pd.DataFrame(forecasts)
     
     if forecast_df.empty:
         return 0
     
-    future = forecast_df[forecast_df['is_forecast'] == 1]
-    historical = forecast_df[forecast_df['is_forecast'] == 0]
-    
-    if future.empty or historical.empty:
-        return 0
-    
-    future_avg = future.groupby(['pulau', 'product_category'])['predicted'].mean()
-    hist_avg = historical.groupby(['pulau', 'product_category'])['actual'].mean()
-    
-    # Products where forecast > historical * threshold
-    risks = 0
-    for idx in future_avg.index:
-        if idx in hist_avg.index:
-            if future_avg[idx] > hist_avg[idx] * (1 + threshold):
-                risks += 1
+    # One group code per (pulau, product_category); future and historical means
+    # come from bincount, and groups missing on either side are NaN
+    pulau_codes, pulau_levels = pd.factorize(forecast_df['pulau'])
+    product_codes, product_levels = pd.factorize(forecast_df['product_category'])
+    codes = np.where(
+        (pulau_codes >= 0) & (product_codes >= 0),
+        pulau_codes * len(product_levels) + product_codes,
+        -1,
+    )
+    n_groups = len(pulau_levels) * len(product_levels)
+    is_forecast = forecast_df['is_forecast']
+    future_avg = _bincount_mean(codes, forecast_df['predicted'], (is_forecast == 1).to_numpy(), n_groups)
+    hist_avg = _bincount_mean(codes, forecast_df['actual'], (is_forecast == 0).to_numpy(), n_groups)
     
-    return risks
+    # Products where forecast > historical * threshold; NaN never compares true
+    return int((future_avg > hist_avg * (1 + threshold)).sum())
 
 
 def get_bundling_opportunities(rules: List[Dict[str, Any]], min_lift: float = 1.5) -> int: